@@ -0,0 +1,64 @@
+# benchmarks/bench_compression.py
+# Measures how well per-connection zlib streams compress real state frames.
+# Run with: python benchmarks/bench_compression.py [--enemies N] [--frames N]
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import time
+import zlib
+from game.world import with_entity
+from network import session as session_module
+from network.protocol import make_compressor
+
+def collect_frames(enemy_count, player_count, frame_count, width, height):
+    """Encoded snapshots from a headless session, one per simulation tick."""
+    session_module.ENEMY_COUNT = enemy_count
+    session = session_module.GameSession("bench", width, height, seed=1234)
+    with session.world.lock:
+        players = session.world.snapshot.players
+        for i in range(player_count):
+            players = with_entity(players, f"('127.0.0.1', {50000 + i})",
+                                  **session_module.new_player())
+        session.world.publish(players=players)
+    frames = []
+    for _ in range(frame_count):
+        session.simulate_tick()
+        frames.append(session.world.snapshot.encode())
+    return frames
+
+def run_stream(frames, params):
+    """Compress frames as one sync-flushed stream; returns (wire bytes, seconds)."""
+    compressor = make_compressor(params) if params else None
+    wire = 0
+    start = time.perf_counter()
+    for frame in frames:
+        if compressor is None:
+            wire += len(frame)
+        else:
+            wire += len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH))
+    return wire, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark state frame compression.")
+    parser.add_argument("--enemies", type=int, default=200)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=60)
+    args = parser.parse_args()
+
+    frames = collect_frames(args.enemies, args.players, args.frames, args.width, args.height)
+    raw = sum(len(f) for f in frames)
+    print(f"{len(frames)} frames, {raw / len(frames):.0f} bytes/frame uncompressed")
+    print(f"{'config':<16}{'bytes/frame':>12}{'ratio':>8}{'us/frame':>10}")
+    configs = [("none", None)]
+    for level in (1, 6, 9):
+        configs.append((f"zlib-{level}", {"level": level, "zdict": False}))
+        configs.append((f"zlib-{level}+dict", {"level": level, "zdict": True}))
+    for name, params in configs:
+        wire, seconds = run_stream(frames, params)
+        print(f"{name:<16}{wire / len(frames):>12.0f}{raw / wire:>8.2f}{seconds / len(frames) * 1e6:>10.1f}")
+
+if __name__ == "__main__":
+    main()
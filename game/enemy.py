@@ -1,17 +1,28 @@
 # game/enemy.py
 import random
 
-def spawn_enemies(world_width, world_height, seed=None):
+def spawn_enemies(world_width, world_height, seed=None, count=2, game_map=None):
     """
     Generate enemies for the world.
-    For simplicity, here we generate two enemies at fixed positions,
-    but you can randomize their placement if desired.
+    The first two enemies are at fixed positions. If count is larger and a
+    game_map is provided, the rest are scattered over walkable cells.
     """
-    if seed is not None:
-        random.seed(seed)
+    # A private generator keeps sessions with different seeds independent.
+    rng = random.Random(seed)
     enemies = {}
     enemies["enemy_1"] = {"x": min(world_width - 2, 10), "y": min(world_height - 2, 10), "char": "E", "hp": 3}
     enemies["enemy_2"] = {"x": min(world_width - 2, 20), "y": min(world_height - 2, 15), "char": "E", "hp": 3}
+    if game_map is not None:
+        taken = {(e["x"], e["y"]) for e in enemies.values()}
+        attempts = 0
+        while len(enemies) < count and attempts < count * 10:
+            attempts += 1
+            x = rng.randint(1, world_width - 2)
+            y = rng.randint(1, world_height - 2)
+            if (x, y) in taken or not game_map.is_walkable(x, y):
+                continue
+            taken.add((x, y))
+            enemies[f"enemy_{len(enemies) + 1}"] = {"x": x, "y": y, "char": "E", "hp": 3}
     return enemies
 
 def spawn_objects(world_width, world_height, seed=None, game_map=None):
@@ -21,8 +32,7 @@ def spawn_objects(world_width, world_height, seed=None, game_map=None):
     Only place an object in a cell if it is reachable.
     The object_probability is lowered to avoid blocking the map.
     """
-    if seed is not None:
-        random.seed(seed)
+    rng = random.Random(seed)
     objects = {}
     object_probability = 0.02  # 2% chance per cell
     reachable = set()
@@ -43,6 +53,6 @@ def spawn_objects(world_width, world_height, seed=None, game_map=None):
         for x in range(1, world_width - 1):
             # If a game_map was given, only consider placing an object in a reachable cell.
             if game_map is None or (x, y) in reachable:
-                if random.random() < object_probability:
+                if rng.random() < object_probability:
                     objects[f"obj_{x}_{y}"] = {"x": x, "y": y, "char": "T", "type": "tree"}
     return objects
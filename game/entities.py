@@ -0,0 +1,136 @@
+# game/entities.py
+from array import array
+
+# Enemy behaviour, in simulation ticks.
+WANDER_CHANCE = 0.2   # Chance per tick that an idle enemy takes a step.
+LEASH_DISTANCE = 6    # Enemies never wander further than this from their spawn.
+RESPAWN_TICKS = 100   # Ticks between an enemy's death and its respawn.
+
+DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+class EntityStore:
+    """
+    Struct-of-arrays storage for many enemies.
+    Each enemy is an integer id indexing parallel typed arrays; dead enemies
+    keep their id while they wait to respawn. `cells` maps the
+    position of every living enemy to its id for O(1) collision checks, and
+    `dirty` collects ids changed since the last call to wire_changes().
+    """
+    def __init__(self):
+        self.x = array('i')
+        self.y = array('i')
+        self.hp = array('i')
+        self.max_hp = array('i')
+        self.spawn_x = array('i')
+        self.spawn_y = array('i')
+        self.char = array('I')        # Code point of the display character.
+        self.alive = array('b')       # 1 = alive, 0 = dead (respawning).
+        self.respawn_at = array('q')  # Tick to respawn at; -1 if not respawning.
+        self.cells = {}
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.x)
+
+    def spawn(self, x, y, hp, char="E"):
+        """Add an enemy at (x, y) and return its id."""
+        eid = len(self.x)
+        self.x.append(x)
+        self.y.append(y)
+        self.hp.append(hp)
+        self.max_hp.append(hp)
+        self.spawn_x.append(x)
+        self.spawn_y.append(y)
+        self.char.append(ord(char))
+        self.alive.append(1)
+        self.respawn_at.append(-1)
+        self.cells[(x, y)] = eid
+        self.dirty.add(eid)
+        return eid
+
+    def kill(self, eid, respawn_at):
+        """Mark an enemy dead; it respawns at its spawn point on tick `respawn_at`."""
+        self.cells.pop((self.x[eid], self.y[eid]), None)
+        self.alive[eid] = 0
+        self.respawn_at[eid] = respawn_at
+        self.dirty.add(eid)
+
+    def damage(self, eid, amount, tick):
+        """Apply damage; returns the remaining hp (<= 0 means the enemy died)."""
+        self.hp[eid] -= amount
+        self.dirty.add(eid)
+        if self.hp[eid] <= 0:
+            self.kill(eid, tick + RESPAWN_TICKS)
+        return self.hp[eid]
+
+    def move(self, eid, x, y):
+        del self.cells[(self.x[eid], self.y[eid])]
+        self.x[eid] = x
+        self.y[eid] = y
+        self.cells[(x, y)] = eid
+        self.dirty.add(eid)
+
+    def at(self, x, y):
+        """Id of the living enemy at (x, y), or None."""
+        return self.cells.get((x, y))
+
+    # Conversion to the dict-of-dicts wire format.
+
+    @staticmethod
+    def wire_key(eid):
+        return f"enemy_{eid}"
+
+    def wire_entity(self, eid):
+        return {"x": self.x[eid], "y": self.y[eid], "char": chr(self.char[eid]), "hp": self.hp[eid]}
+
+    def to_wire(self):
+        """Full {"enemy_<id>": {...}} table of living enemies."""
+        return {self.wire_key(eid): self.wire_entity(eid)
+                for eid in range(len(self.x)) if self.alive[eid]}
+
+    def wire_changes(self, table):
+        """
+        Copy of a previously produced wire `table` with the entries changed
+        since the last call updated, or None if nothing changed.
+        """
+        if not self.dirty:
+            return None
+        new_table = dict(table)
+        for eid in self.dirty:
+            if self.alive[eid]:
+                new_table[self.wire_key(eid)] = self.wire_entity(eid)
+            else:
+                new_table.pop(self.wire_key(eid), None)
+        self.dirty.clear()
+        return new_table
+
+def update_enemies(store, tick, rng, is_open):
+    """
+    One simulation tick of enemy behaviour: living enemies wander around their
+    spawn point, dead ones respawn once their timer runs out.
+    `is_open(x, y)` reports whether terrain, objects and players allow a step.
+    """
+    x, y, alive, respawn_at = store.x, store.y, store.alive, store.respawn_at
+    spawn_x, spawn_y = store.spawn_x, store.spawn_y
+    cells = store.cells
+    for eid in range(len(x)):
+        if alive[eid]:
+            if rng.random() >= WANDER_CHANCE:
+                continue
+            dx, dy = DIRECTIONS[rng.randrange(4)]
+            nx, ny = x[eid] + dx, y[eid] + dy
+            if abs(nx - spawn_x[eid]) > LEASH_DISTANCE or abs(ny - spawn_y[eid]) > LEASH_DISTANCE:
+                continue
+            if (nx, ny) in cells or not is_open(nx, ny):
+                continue
+            store.move(eid, nx, ny)
+        elif 0 <= respawn_at[eid] <= tick:
+            sx, sy = spawn_x[eid], spawn_y[eid]
+            if (sx, sy) in cells or not is_open(sx, sy):
+                continue  # Spawn point occupied; try again next tick.
+            x[eid], y[eid] = sx, sy
+            store.hp[eid] = store.max_hp[eid]
+            alive[eid] = 1
+            respawn_at[eid] = -1
+            cells[(sx, sy)] = eid
+            store.dirty.add(eid)
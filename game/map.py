@@ -1,6 +1,18 @@
 # game/map.py
 import random
 import curses
+import threading
+from collections import OrderedDict
+
+# Process-wide cache of generated terrain, shared by every map (and so every
+# game session) with the same seed and size. Chunks are immutable tuples of
+# row strings: (seed, width, chunk_height, chunk_index) -> chunk.
+# Sessions come and go with their own seeds, so only the CHUNK_CACHE_SIZE
+# most recently used chunks are kept; a map holds on to the chunks it has
+# already loaded either way.
+CHUNK_CACHE_SIZE = 4096
+_chunk_cache = OrderedDict()
+_chunk_cache_lock = threading.Lock()
 
 class InfiniteGameMap:
     def __init__(self, width, chunk_height=20, seed=None):
@@ -12,9 +24,15 @@ class InfiniteGameMap:
         self.width = width
         self.chunk_height = chunk_height
         self.seed = seed if seed is not None else random.randint(0, 1000000)
-        self.chunks = {}  # Dictionary: chunk_index -> 2D list of tiles
+        self.chunks = {}  # Dictionary: chunk_index -> tuple of row strings (shared, read-only)
+        # Built blocks, per chunk: chunk_index -> {(x, local_y): block}.
+        # Each chunk's dict is replaced, never mutated, so readers can hold on
+        # to it; overlay_versions[chunk_index] increases with every change.
+        self.overlays = {}
+        self.overlay_versions = {}
 
     def generate_chunk(self, chunk_index):
+        """Generate a chunk's terrain rows; pure function of seed, width and index."""
         local_seed = self.seed + chunk_index
         rng = random.Random(local_seed)
         chunk = []
@@ -31,14 +49,26 @@ class InfiniteGameMap:
             # Ensure center is open.
             center = self.width // 2
             row_data[center] = '.'
-            chunk.append(row_data)
-        self.chunks[chunk_index] = chunk
-        return chunk
+            chunk.append(''.join(row_data))
+        return tuple(chunk)
 
     def get_chunk(self, chunk_index):
-        if chunk_index not in self.chunks:
-            return self.generate_chunk(chunk_index)
-        return self.chunks[chunk_index]
+        chunk = self.chunks.get(chunk_index)
+        if chunk is None:
+            key = (self.seed, self.width, self.chunk_height, chunk_index)
+            with _chunk_cache_lock:
+                chunk = _chunk_cache.get(key)
+                if chunk is not None:
+                    _chunk_cache.move_to_end(key)
+            if chunk is None:
+                chunk = self.generate_chunk(chunk_index)
+                with _chunk_cache_lock:
+                    chunk = _chunk_cache.setdefault(key, chunk)
+                    _chunk_cache.move_to_end(key)
+                    while len(_chunk_cache) > CHUNK_CACHE_SIZE:
+                        _chunk_cache.popitem(last=False)
+            self.chunks[chunk_index] = chunk
+        return chunk
 
     def get_tile(self, x, y):
         if x < 0 or x >= self.width or y < 0:
@@ -51,6 +81,52 @@ class InfiniteGameMap:
     def is_walkable(self, x, y):
         return self.get_tile(x, y) == '.'
 
+    def chunk_index_of(self, y):
+        return y // self.chunk_height
+
+    def visible_chunks(self, camera_y, visible_rows):
+        """Chunk indices overlapping rows [camera_y, camera_y + visible_rows)."""
+        first = self.chunk_index_of(max(0, camera_y))
+        last = self.chunk_index_of(max(0, camera_y + visible_rows - 1))
+        return range(first, last + 1)
+
+    def get_block(self, x, y):
+        """Built block at (x, y), or None."""
+        overlay = self.overlays.get(self.chunk_index_of(y), {})
+        return overlay.get((x, y % self.chunk_height))
+
+    def set_block(self, x, y, block):
+        """Place a built block and bump its chunk's version. Returns the chunk index."""
+        chunk_index = self.chunk_index_of(y)
+        overlay = dict(self.overlays.get(chunk_index, {}))
+        overlay[(x, y % self.chunk_height)] = block
+        self.overlays[chunk_index] = overlay
+        self.overlay_versions[chunk_index] = self.overlay_versions.get(chunk_index, 0) + 1
+        return chunk_index
+
+    def clear_overlays(self):
+        """Forget every overlay received so far (the server's versions restarted)."""
+        self.overlays = {}
+        self.overlay_versions = {}
+
+    def overlay_tiles(self, chunk_index):
+        """
+        (version, [[x, y, block], ...]) for a chunk, in world coordinates.
+        Not atomic: callers that share the map with a writer hold its lock.
+        """
+        overlay = self.overlays.get(chunk_index, {})
+        version = self.overlay_versions.get(chunk_index, 0)
+        base_y = chunk_index * self.chunk_height
+        return version, [[x, base_y + local_y, block] for (x, local_y), block in overlay.items()]
+
+    def apply_overlay(self, chunk_index, version, tiles):
+        """Replace a chunk's overlay with one received from the server, if newer."""
+        if version <= self.overlay_versions.get(chunk_index, 0):
+            return False
+        self.overlays[chunk_index] = {(x, y % self.chunk_height): block for x, y, block in tiles}
+        self.overlay_versions[chunk_index] = version
+        return True
+
     def draw_scaled(self, stdscr, scale=1, camera_x=0, camera_y=0, width_limit=None):
         """
         Draw the visible portion of the infinite map onto the screen.
@@ -78,3 +154,14 @@ class InfiniteGameMap:
                             stdscr.addch(screen_y + dy, screen_x + dx, tile)
                         except curses.error:
                             pass
+        # Built blocks: only the overlays of chunks on screen are visited.
+        for chunk_index in self.visible_chunks(camera_y, visible_rows):
+            base_y = chunk_index * self.chunk_height
+            for (x, local_y), block in self.overlays.get(chunk_index, {}).items():
+                gy = base_y + local_y
+                if not (camera_y <= gy < camera_y + visible_rows and camera_x <= x < camera_x + visible_cols):
+                    continue
+                try:
+                    stdscr.addstr((gy - camera_y) * scale, (x - camera_x) * scale, block)
+                except curses.error:
+                    pass
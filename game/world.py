@@ -0,0 +1,86 @@
+# game/world.py
+import json
+import threading
+
+class WorldSnapshot:
+    """
+    Immutable, versioned view of the authoritative world state.
+    Entity tables (players, enemies, objects) are plain dicts that are shared
+    between versions and must never be mutated once published:
+    writers copy the table (and the entity) they change and publish a new
+    snapshot, so readers can use any snapshot without holding a lock.
+    map_seed, map_width and chunk_height describe the terrain, so clients can
+    generate the same map as the server.
+    """
+    __slots__ = ("version", "map_seed", "map_width", "chunk_height", "players", "enemies",
+                 "objects", "_encoded")
+
+    def __init__(self, version, map_seed, map_width, chunk_height, players, enemies, objects):
+        self.version = version
+        self.map_seed = map_seed
+        self.map_width = map_width
+        self.chunk_height = chunk_height
+        self.players = players
+        self.enemies = enemies
+        self.objects = objects
+        self._encoded = None
+
+    def evolve(self, **tables):
+        """Return the next version, replacing only the given tables."""
+        return WorldSnapshot(
+            self.version + 1,
+            self.map_seed,
+            self.map_width,
+            self.chunk_height,
+            tables.get("players", self.players),
+            tables.get("enemies", self.enemies),
+            tables.get("objects", self.objects),
+        )
+
+    def to_dict(self):
+        return {
+            "players": self.players,
+            "enemies": self.enemies,
+            "objects": self.objects,
+            "map_seed": self.map_seed,
+            "map_width": self.map_width,
+            "chunk_height": self.chunk_height,
+            "version": self.version,
+        }
+
+    def encode(self):
+        """Newline-terminated JSON frame, computed once per snapshot."""
+        if self._encoded is None:
+            # Benign race: concurrent callers produce identical bytes.
+            self._encoded = (json.dumps(self.to_dict()) + "\n").encode()
+        return self._encoded
+
+class World:
+    """
+    Holder for the current WorldSnapshot.
+    Writers take `lock`, build new tables from `snapshot` and call publish();
+    readers just read `snapshot` (a single attribute load) without locking.
+    """
+    def __init__(self, map_seed, map_width, chunk_height, players=None, enemies=None, objects=None):
+        # Re-entrant so a command can be logged and applied as one step
+        # (see GameSession.run_command).
+        self.lock = threading.RLock()
+        self.snapshot = WorldSnapshot(0, map_seed, map_width, chunk_height,
+                                      players or {}, enemies or {}, objects or {})
+
+    def publish(self, **tables):
+        """Swap in a new version with the given tables. Caller must hold `lock`."""
+        self.snapshot = self.snapshot.evolve(**tables)
+        return self.snapshot
+
+def with_entity(table, key, **fields):
+    """Copy of `table` where entity `key` is replaced by a copy with `fields` updated."""
+    new_table = dict(table)
+    new_table[key] = {**table.get(key, {}), **fields}
+    return new_table
+
+def without_entity(table, key):
+    """Copy of `table` with entity `key` removed."""
+    new_table = dict(table)
+    new_table.pop(key, None)
+    return new_table
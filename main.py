@@ -1,7 +1,8 @@
 import curses
 import time
 from network.server import start_server, PORT
-from network.client import run_client
+from network.client import run_client, DEFAULT_SESSION
+from network.relay import RELAY_PORT
 
 def main_menu(stdscr):
     curses.curs_set(0)
@@ -9,7 +10,7 @@ def main_menu(stdscr):
     # Enable mouse events for the main menu.
     curses.mousemask(curses.ALL_MOUSE_EVENTS)
     
-    options = ["Host a game", "Join a game", "Quit"]
+    options = ["Host a game", "Join a game", "Watch a game", "Quit"]
     current_selection = 0
     start_y = 3
     start_x = 4
@@ -53,6 +54,15 @@ def get_server_ip(stdscr):
     curses.noecho()
     return ip.decode('utf-8')
 
+def get_session_name(stdscr):
+    stdscr.clear()
+    stdscr.addstr(2, 2, "Enter session name (blank for default): ")
+    stdscr.refresh()
+    curses.echo()
+    name = stdscr.getstr(3, 2, 20)
+    curses.noecho()
+    return name.decode('utf-8').strip() or DEFAULT_SESSION
+
 def show_progress_bar(stdscr, message="Generating Map...", duration=3):
     stdscr.clear()
     max_y, max_x = stdscr.getmaxyx()
@@ -81,6 +91,11 @@ def main(stdscr):
         return
 
     server_host = "127.0.0.1"
+    session = DEFAULT_SESSION
+    if mode == "watch":
+        # Spectate through a relay (python -m network.relay) rather than the game server.
+        run_client(stdscr, get_server_ip(stdscr), RELAY_PORT, spectator=True)
+        return
     if mode == "host":
         max_y, max_x = stdscr.getmaxyx()
         start_server(max_x, max_y)
@@ -88,8 +103,9 @@ def main(stdscr):
         show_progress_bar(stdscr, message="Generating Map...", duration=3)
     elif mode == "join":
         server_host = get_server_ip(stdscr)
+        session = get_session_name(stdscr)
     
-    run_client(stdscr, server_host, PORT)
+    run_client(stdscr, server_host, PORT, session)
 
 if __name__ == "__main__":
     curses.wrapper(main)
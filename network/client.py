@@ -7,25 +7,61 @@ import socket
 import threading
 import json
 import time
+from collections import deque
 from game.map import InfiniteGameMap
 from game.combat import combat_minigame  # combat.py is now in game folder
+from network.delta import apply_delta
+from network.prediction import MovePredictor, Interpolator
+from network.profiler import FrameProfiler
+from network.protocol import MAX_PATH_STEPS, FrameReader, encode_frame, encode_path
 
 PORT = 12345
+DEFAULT_SESSION = "default"
+# Stream compression to ask the server for in the hello (None to disable).
+COMPRESSION = {"zdict": True}
+PING_INTERVAL = 1.0  # Seconds between latency pings while the profiler is shown.
+PATH_SEND_INTERVAL = 0.1  # Seconds between movement commands (one server tick).
+MOVE_KEYS = {'w': (0, -1), 's': (0, 1), 'a': (-1, 0), 'd': (1, 0)}
 game_state = {}
+my_client_id = None  # Assigned by the server's welcome frame.
+welcome_count = 0    # Welcomes received; a sharded server re-welcomes after a handoff.
+chunk_updates = deque()  # (chunk_index, version, tiles), or None to reset, waiting to be applied to the map.
+profiler = FrameProfiler()
 
 def network_listener(sock):
-    global game_state
-    buffer = ""
+    global game_state, my_client_id, welcome_count
+    reader = FrameReader()
     try:
         while True:
-            data = sock.recv(1024)
+            data = sock.recv(65536)
             if not data:
                 break
-            buffer += data.decode()
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
+            for line in reader.feed(data):
                 try:
-                    game_state = json.loads(line)
+                    message = json.loads(line)
+                    if "hello" in message:
+                        pass  # Handshake reply; FrameReader handles compression.
+                    elif "pong" in message:
+                        profiler.record_pong(message["pong"])
+                    elif "welcome" in message:
+                        my_client_id = message["welcome"]
+                        welcome_count += 1
+                    elif "error" in message:
+                        print("[CLIENT] Server error:", message["error"])
+                    elif "chunks" in message:
+                        if message.get("reset"):
+                            chunk_updates.append(None)  # A relay lost its server.
+                        for chunk_index, overlay in message["chunks"].items():
+                            chunk_updates.append((int(chunk_index), overlay["v"], overlay["tiles"]))
+                    elif "delta" in message:
+                        # From a spectator relay; deltas for another base are skipped.
+                        state = apply_delta(game_state, message["delta"])
+                        if state is not None:
+                            game_state = state
+                            profiler.record_snapshot(len(line))
+                    else:
+                        game_state = message
+                        profiler.record_snapshot(len(line))
                 except Exception as e:
                     print("[CLIENT] Error decoding state:", e)
     except Exception as e:
@@ -34,9 +70,13 @@ def network_listener(sock):
         sock.close()
 
 class Game:
-    def __init__(self, stdscr, sock):
+    def __init__(self, stdscr, sock, spectator=False):
         self.stdscr = stdscr
         self.sock = sock
+        # Spectators have no player: they are pushed every chunk, and w/s
+        # scroll the view instead of moving.
+        self.spectator = spectator
+        self.spectator_camera_y = 0
         curses.curs_set(0)
         self.stdscr.nodelay(True)
         self.stdscr.timeout(50)
@@ -53,17 +93,99 @@ class Game:
         # Mouse raw coordinates (updated via curses.getmouse()).
         self.mouse_raw_x = None
         self.mouse_raw_y = None
+        # Local movement prediction and smoothing of other players.
+        self.predictor = MovePredictor()
+        # Steps predicted but not sent yet; they go out as one path per
+        # PATH_SEND_INTERVAL, acknowledged through the last step's seq.
+        self.unsent_steps = []
+        self.unsent_seq = None
+        self.last_path_send = 0.0
+        self.interpolator = Interpolator()
+        self.synced_state = None  # Last snapshot seen by sync_state().
+        self.blocked_cells = set()  # (x, y) of its enemies and objects, for is_walkable().
+        self.requested_chunks = None  # Chunk range last sent in "sync_chunks".
+        self.seen_welcomes = 0
+        # Frame profiler overlay ("f") and per-frame trace file ("t").
+        self.show_profiler = False
+        self.last_ping = 0.0
 
     def wait_for_map_seed(self):
         while "map_seed" not in game_state:
             time.sleep(0.1)
         seed = game_state["map_seed"]
-        max_y, max_x = self.stdscr.getmaxyx()
-        self.game_map = InfiniteGameMap(max_x, chunk_height=20, seed=seed)
+        # Terrain depends on the map's width, so use the server's, not ours.
+        self.game_map = InfiniteGameMap(game_state["map_width"],
+                                        chunk_height=game_state["chunk_height"], seed=seed)
         self.stdscr.addstr(0, 0, f"Map seed: {seed}")
         self.stdscr.refresh()
         time.sleep(1)
 
+    def is_walkable(self, x, y):
+        """Client-side mirror of the server's movement check."""
+        if self.game_map is None or not self.game_map.is_walkable(x, y):
+            return False
+        return (x, y) not in self.blocked_cells
+
+    def my_player(self):
+        """The server's view of our player, or None before we've joined."""
+        return game_state.get("players", {}).get(my_client_id)
+
+    def my_position(self):
+        if self.predictor.has_position():
+            return self.predictor.x, self.predictor.y
+        my_player = self.my_player()
+        if my_player is None:
+            return None
+        return my_player.get("x", 0), my_player.get("y", 0)
+
+    def request_visible_chunks(self, camera_y):
+        """Ask the server for built-block overlays of chunks that came into view."""
+        max_y, max_x = self.stdscr.getmaxyx()
+        chunks = self.game_map.visible_chunks(camera_y, max_y // self.scale)
+        if welcome_count != self.seen_welcomes:
+            # (Re)joined a server that does not know our view yet.
+            self.seen_welcomes = welcome_count
+            self.requested_chunks = None
+        if chunks == self.requested_chunks:
+            return
+        self.requested_chunks = chunks
+        known = {str(c): self.game_map.overlay_versions.get(c, 0) for c in chunks}
+        try:
+            self.sock.sendall((json.dumps({"sync_chunks": known}) + "\n").encode())
+        except Exception:
+            pass
+
+    def sync_state(self):
+        """Apply chunk overlays, and reconcile prediction when a new snapshot arrives."""
+        while chunk_updates and self.game_map is not None:
+            update = chunk_updates.popleft()
+            if update is None:
+                self.game_map.clear_overlays()
+            else:
+                self.game_map.apply_overlay(*update)
+        state = game_state
+        seed = state.get("map_seed")
+        if self.game_map is not None and seed is not None and seed != self.game_map.seed:
+            # The server we watch through a relay was restarted with a new map.
+            old_map = self.game_map
+            self.game_map = InfiniteGameMap(state["map_width"], chunk_height=state["chunk_height"],
+                                            seed=seed)
+            self.game_map.overlays = old_map.overlays
+            self.game_map.overlay_versions = old_map.overlay_versions
+        if state is self.synced_state:
+            return
+        self.synced_state = state
+        self.blocked_cells = {(entity.get("x"), entity.get("y"))
+                              for table in ("enemies", "objects")
+                              for entity in state.get(table, {}).values()}
+        players = state.get("players", {})
+        my_player = players.get(my_client_id)
+        if my_player is not None:
+            self.predictor.reconcile(my_player.get("x", 0), my_player.get("y", 0),
+                                     my_player.get("seq", 0), self.is_walkable)
+        others = {pid: p for pid, p in players.items() if pid != my_client_id}
+        self.interpolator.update(others)
+
     def shop_menu(self):
         options = [("Wall Block", "#", 10), ("Corner Block", "|_", 15)]
         selection = 0
@@ -102,11 +224,11 @@ class Game:
         game_area_width = max_x - ui_width
         camera_x = 0
         camera_y = 0
-        if "players" in game_state and game_state["players"]:
-            my_id = list(game_state["players"].keys())[0]
-            my_player = game_state["players"][my_id]
-            player_x = my_player.get("x", 0)
-            player_y = my_player.get("y", 0)
+        position = self.my_position()
+        if self.spectator:
+            camera_y = self.spectator_camera_y
+        elif position is not None:
+            player_x, player_y = position
             visible_rows = max_y // self.scale
             camera_y = max(0, player_y - visible_rows // 2)
         return camera_x, camera_y
@@ -119,9 +241,10 @@ class Game:
         ui_win.clear()
         ui_win.box()
         # Display player health.
-        if "players" in game_state and game_state["players"]:
-            my_id = list(game_state["players"].keys())[0]
-            my_player = game_state["players"][my_id]
+        my_player = self.my_player()
+        if self.spectator:
+            ui_win.addstr(1, 2, "Spectating")
+        elif my_player is not None:
             health = my_player.get("hp", 5)
             ui_win.addstr(1, 2, f"Health: {health}")
         # Inventory listing.
@@ -130,6 +253,11 @@ class Game:
             slot = self.inventory[i] if i < len(self.inventory) else None
             indicator = "->" if i == self.active_inventory_slot else "  "
             ui_win.addstr(5 + i, 2, f"{indicator}{i+1}: {slot if slot else 'Empty'}")
+        if self.show_profiler:
+            for row, text in enumerate(profiler.summary_lines(), start=11):
+                if row >= max_y - 1:
+                    break
+                ui_win.addstr(row, 2, text[:max(0, ui_width - 4)])
         # Support left-click selection in UI panel:
         # Get mouse event from curses (if available) and if the click is within the UI panel.
         try:
@@ -189,8 +317,68 @@ class Game:
         self.stdscr.refresh()
         self.stdscr.getch()
 
-    def process_input(self):
+    def read_movement(self):
+        """
+        Gather every movement key available this frame into one path.
+        Returns (steps, next_key) where next_key is the first non-movement
+        key read (or -1), to be handled after the path is sent.
+        """
+        steps = []
         key = self.stdscr.getch()
+        profiler.mark("idle")  # The first read blocks for up to 50 ms.
+        # After the first (blocking) read, drain queued key-repeats without waiting.
+        self.stdscr.timeout(0)
+        try:
+            while key != -1:
+                try:
+                    step = MOVE_KEYS.get(chr(key).lower())
+                except Exception:
+                    step = None
+                if step is None:
+                    break
+                steps.append(step)
+                if len(steps) >= MAX_PATH_STEPS:
+                    # Leave the rest of the key-repeats for the next frame.
+                    key = -1
+                    break
+                key = self.stdscr.getch()
+        finally:
+            self.stdscr.timeout(50)
+        return steps, key
+
+    def queue_path(self, steps):
+        # Move our '@' right away; the server's ack reconciles it later.
+        if len(self.unsent_steps) + len(steps) > MAX_PATH_STEPS and not self.send_path(force=True):
+            return False
+        self.unsent_seq = self.predictor.apply_local(steps, self.is_walkable)
+        self.unsent_steps.extend(steps)
+        return True
+
+    def send_path(self, force=False):
+        """Send the queued steps as one path, once PATH_SEND_INTERVAL has passed (or if forced)."""
+        now = time.monotonic()
+        if not self.unsent_steps or (not force and now - self.last_path_send < PATH_SEND_INTERVAL):
+            return True
+        self.last_path_send = now
+        steps, self.unsent_steps = self.unsent_steps, []
+        try:
+            message = json.dumps({"path": encode_path(steps), "seq": self.unsent_seq}) + "\n"
+            self.sock.sendall(message.encode())
+        except Exception as e:
+            self.stdscr.addstr(0, 0, f"Error sending movement: {e}")
+            self.stdscr.refresh()
+            time.sleep(1)
+            return False
+        return True
+
+    def process_input(self):
+        steps, key = self.read_movement()
+        if self.spectator:
+            self.spectator_camera_y = max(0, self.spectator_camera_y + sum(dy for _, dy in steps))
+        elif steps and not self.queue_path(steps):
+            return False
+        if not self.send_path():
+            return False
         if key == curses.KEY_MOUSE:
             try:
                 _, mx, my, _, bstate = curses.getmouse()
@@ -238,26 +426,23 @@ class Game:
         if ch == 'b':
             self.building_mode_active = not self.building_mode_active
             return True
-        dx, dy = 0, 0
-        if ch == 'w':
-            dy = -1
-        elif ch == 's':
-            dy = 1
-        elif ch == 'a':
-            dx = -1
-        elif ch == 'd':
-            dx = 1
-        elif ch == 'x':
+        # Toggle the frame profiler overlay, and its trace file.
+        if ch == 'f':
+            self.show_profiler = not self.show_profiler
+            return True
+        if ch == 't':
+            if profiler.trace_file is None:
+                profiler.start_trace(time.strftime("frame_trace_%Y%m%d_%H%M%S.csv"))
+            else:
+                profiler.stop_trace()
+            return True
+        if ch == 'x':
             state_data = game_state
-            my_id = None
-            if "players" in state_data and state_data["players"]:
-                my_id = list(state_data["players"].keys())[0]
+            position = self.my_position()
             target_enemy = None
             enemy_offset = (0, 0)
-            if my_id:
-                my_player = state_data["players"][my_id]
-                player_x = my_player.get("x", 0)
-                player_y = my_player.get("y", 0)
+            if position is not None:
+                player_x, player_y = position
                 if "enemies" in state_data:
                     for enemy in state_data["enemies"].values():
                         ex = enemy.get("x", 0)
@@ -280,6 +465,9 @@ class Game:
                 curses.curs_set(0)
                 self.stdscr.nodelay(True)
                 self.stdscr.timeout(50)
+                # The offset is from our predicted position; the server needs those moves first.
+                if not self.send_path(force=True):
+                    return False
                 attack_command = {"attack": True,
                                   "dx": enemy_offset[0],
                                   "dy": enemy_offset[1],
@@ -295,15 +483,6 @@ class Game:
                 return True
             else:
                 return True
-        if dx != 0 or dy != 0:
-            try:
-                message = json.dumps({"dx": dx, "dy": dy}) + "\n"
-                self.sock.sendall(message.encode())
-            except Exception as e:
-                self.stdscr.addstr(0, 0, f"Error sending movement: {e}")
-                self.stdscr.refresh()
-                time.sleep(1)
-                return False
         return True
 
     def render(self):
@@ -313,29 +492,26 @@ class Game:
         game_area_width = max_x - ui_width
         camera_x, camera_y = self.compute_camera_offset()
         if self.game_map:
+            if not self.spectator:
+                self.request_visible_chunks(camera_y)
             self.game_map.draw_scaled(self.stdscr, scale=self.scale,
                                        camera_x=camera_x, camera_y=camera_y,
                                        width_limit=game_area_width)
+        profiler.mark("map")
         for row in range(max_y):
             try:
                 self.stdscr.addch(row, game_area_width, '|')
             except curses.error:
                 pass
-        if "custom_tiles" in game_state:
-            for tile in game_state["custom_tiles"].values():
-                x = tile.get("x", 0)
-                y = tile.get("y", 0)
-                char = tile.get("char", tile.get("block", "?"))
-                screen_x = (x - camera_x) * self.scale
-                screen_y = (y - camera_y) * self.scale
-                try:
-                    self.stdscr.addch(screen_y, screen_x, char)
-                except curses.error:
-                    pass
         if "players" in game_state:
-            for player in game_state["players"].values():
-                x = player.get("x", 0)
-                y = player.get("y", 0)
+            for pid, player in game_state["players"].items():
+                if pid == my_client_id and self.predictor.has_position():
+                    x, y = self.predictor.x, self.predictor.y
+                elif pid in self.interpolator.tracks:
+                    x, y = self.interpolator.position(pid)
+                else:
+                    x = player.get("x", 0)
+                    y = player.get("y", 0)
                 char = player.get("char", "@")
                 screen_x = (x - camera_x) * self.scale
                 screen_y = (y - camera_y) * self.scale
@@ -398,31 +574,61 @@ class Game:
                 self.stdscr.addstr(center_y, text_x, preview_text, attr)
             except curses.error:
                 pass
+        profiler.mark("entities")
         self.draw_ui_panel()
+        profiler.mark("ui")
         self.stdscr.refresh()
+        profiler.mark("refresh")
+
+    def send_ping(self):
+        """Measure round-trip latency while the profiler overlay is visible."""
+        now = time.perf_counter()
+        if not self.show_profiler or now - self.last_ping < PING_INTERVAL:
+            return
+        self.last_ping = now
+        try:
+            self.sock.sendall(encode_frame({"ping": now}))
+        except Exception:
+            pass
 
     def run(self):
         self.wait_for_map_seed()
         running = True
         while running:
+            profiler.begin_frame()
             running = self.process_input()
+            profiler.mark("input")
+            self.sync_state()
+            self.send_ping()
+            profiler.mark("sync")
             self.render()
+            profiler.end_frame()
             time.sleep(0.01)  # Short delay to reduce CPU usage.
+        profiler.stop_trace()
         if self.quit_to_menu:
             return "quit_to_menu"
         return "exit"
 
-def run_client(stdscr, server_host, server_port):
+def run_client(stdscr, server_host, server_port, session=DEFAULT_SESSION, spectator=False):
+    """
+    Play `session` on the given server, or with `spectator` just watch it;
+    spectators normally connect to a relay (network/relay.py) instead.
+    """
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         sock.connect((server_host, server_port))
+        # Pick the game session to join on this server.
+        hello = {"session": session, "compress": COMPRESSION}
+        if spectator:
+            hello["spectator"] = True
+        sock.sendall(encode_frame({"hello": hello}))
     except Exception as e:
         stdscr.addstr(0, 0, f"Could not connect to server: {e}")
         stdscr.refresh()
         time.sleep(3)
         return "exit"
     threading.Thread(target=network_listener, args=(sock,), daemon=True).start()
-    game = Game(stdscr, sock)
+    game = Game(stdscr, sock, spectator)
     result = game.run()
     sock.close()
     return result
@@ -0,0 +1,143 @@
+# network/connection.py
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from network.protocol import make_compressor
+
+# Outbound budget per connection. A client whose queued ordered frames stay
+# above MAX_QUEUED_BYTES for longer than OVER_BUDGET_GRACE seconds, or whose
+# socket has been stuck in a single send for SEND_STALL_TIMEOUT seconds, is
+# dropped. The pending state frame does not count: at most one is ever
+# queued, and a big world's snapshot can be larger than the whole budget.
+MAX_QUEUED_BYTES = 256 * 1024
+OVER_BUDGET_GRACE = 2.0
+SEND_STALL_TIMEOUT = 5.0
+
+class ClientConnection:
+    """
+    Wraps a client socket with a bounded outbound queue drained by its own
+    writer thread, so a slow client never blocks the game for everyone else.
+      - State frames are coalesced: only the latest pending snapshot is kept.
+      - Other frames are queued in order and always sent before the next state.
+    """
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.closed = False
+        self._frames = deque()      # Ordered non-state frames (bytes).
+        self._state_frame = None    # Latest pending state frame (bytes) or None.
+        self._state_version = -1    # Version of the newest state frame queued so far.
+        self._queued_bytes = 0      # Bytes of ordered frames waiting to be sent.
+        self._over_budget_since = None
+        self._sending_since = None
+        self._compressor = None     # zlib stream, once compression is negotiated.
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def send(self, data):
+        """Queue an ordered frame (e.g. a reply) for delivery."""
+        with self._cond:
+            if self.closed:
+                return False
+            self._frames.append(data)
+            self._queued_bytes += len(data)
+            self._cond.notify_all()
+        return self._check_budget()
+
+    def enable_compression(self, params):
+        """Compress every frame queued after this call with a zlib stream."""
+        with self._cond:
+            # A marker in the ordered queue, so frames sent before stay plain.
+            self._frames.append(params)
+            self._cond.notify_all()
+
+    def send_state(self, data, version=None):
+        """
+        Queue a state frame, replacing any state frame not yet sent.
+        If `version` is given, frames older than one already queued are ignored.
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            if version is not None:
+                if version <= self._state_version:
+                    return True
+                self._state_version = version
+            self._state_frame = data
+            self._cond.notify_all()
+        return self._check_budget()
+
+    def flush(self, timeout=1.0):
+        """Wait up to `timeout` seconds for everything queued to be written."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.closed and (self._frames or self._state_frame is not None
+                                       or self._sending_since is not None):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _check_budget(self):
+        now = time.monotonic()
+        with self._cond:
+            stalled = self._sending_since is not None and now - self._sending_since > SEND_STALL_TIMEOUT
+            if self._queued_bytes > MAX_QUEUED_BYTES:
+                if self._over_budget_since is None:
+                    self._over_budget_since = now
+            else:
+                self._over_budget_since = None
+            over_budget = self._over_budget_since is not None and now - self._over_budget_since > OVER_BUDGET_GRACE
+        if stalled or over_budget:
+            print(f"[SERVER] Dropping slow client {self.addr}")
+            self.close()
+            return False
+        return True
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self.closed and not self._frames and self._state_frame is None:
+                    self._cond.wait()
+                if self.closed:
+                    return
+                if self._frames:
+                    data = self._frames.popleft()
+                    if isinstance(data, dict):
+                        self._compressor = make_compressor(data)
+                        continue
+                    self._queued_bytes -= len(data)
+                else:
+                    data = self._state_frame
+                    self._state_frame = None
+                self._sending_since = time.monotonic()
+            if self._compressor is not None:
+                data = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            try:
+                self.conn.sendall(data)
+            except Exception:
+                self.close()
+                return
+            finally:
+                with self._cond:
+                    self._sending_since = None
+                    self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._frames.clear()
+            self._state_frame = None
+            self._queued_bytes = 0
+            self._cond.notify_all()
+        # Shutting down unblocks both the writer's sendall and the reader's recv.
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
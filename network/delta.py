@@ -0,0 +1,46 @@
+# network/delta.py
+# Snapshot deltas for the spectator relay (see network/relay.py).
+#
+# A delta frame turns the state with version "base" into the one with
+# version "version":
+#   {"delta": {"base": 7, "version": 9,
+#              "tables": {"players": {"set": {key: entity, ...}, "del": [key, ...]}}}}
+# Only changed tables appear; changed entities are sent whole.
+
+TABLES = ("players", "enemies", "objects")
+
+def diff_table(old, new):
+    changes = {}
+    updated = {k: v for k, v in new.items() if old.get(k) != v}
+    removed = [k for k in old if k not in new]
+    if updated:
+        changes["set"] = updated
+    if removed:
+        changes["del"] = removed
+    return changes
+
+def diff_state(old, new):
+    """Delta taking state dict `old` to `new` (both as sent by the server)."""
+    tables = {}
+    for table in TABLES:
+        changes = diff_table(old.get(table, {}), new.get(table, {}))
+        if changes:
+            tables[table] = changes
+    return {"base": old.get("version"), "version": new.get("version"), "tables": tables}
+
+def apply_delta(state, delta):
+    """
+    New state dict with `delta` applied, or None if it was made against a
+    different version than `state`. `state` itself is left unchanged.
+    """
+    if state.get("version") != delta["base"]:
+        return None
+    new_state = dict(state)
+    new_state["version"] = delta["version"]
+    for table, changes in delta["tables"].items():
+        new_table = dict(state.get(table, {}))
+        new_table.update(changes.get("set", {}))
+        for key in changes.get("del", ()):
+            new_table.pop(key, None)
+        new_state[table] = new_table
+    return new_state
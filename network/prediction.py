@@ -0,0 +1,84 @@
+# network/prediction.py
+import time
+
+class MovePredictor:
+    """
+    Client-side prediction for the local player.
+    Move commands (a path of unit steps) are applied immediately against
+    local walkability and remembered with a sequence number until the server
+    acknowledges them (via the player's "seq" field in a snapshot). On each snapshot the predicted
+    position is rebuilt from the server's position by replaying the moves
+    the server has not processed yet.
+    """
+    def __init__(self):
+        self.next_seq = 1
+        self.pending = []  # [(seq, steps)] sent but not yet acknowledged.
+        self.x = None
+        self.y = None
+
+    def has_position(self):
+        return self.x is not None
+
+    def apply_local(self, steps, is_walkable):
+        """Predict a move command and return the sequence number to send with it."""
+        seq = self.next_seq
+        self.next_seq += 1
+        self.pending.append((seq, steps))
+        if self.has_position():
+            self.x, self.y = walk(self.x, self.y, steps, is_walkable)
+        return seq
+
+    def reconcile(self, server_x, server_y, acked_seq, is_walkable):
+        """Roll back to the server's position and replay unacknowledged moves."""
+        self.pending = [move for move in self.pending if move[0] > acked_seq]
+        x, y = server_x, server_y
+        for _, steps in self.pending:
+            x, y = walk(x, y, steps, is_walkable)
+        self.x, self.y = x, y
+
+def walk(x, y, steps, is_walkable):
+    """Apply unit steps from (x, y), skipping blocked ones like the server does."""
+    for dx, dy in steps:
+        if is_walkable(x + dx, y + dy):
+            x += dx
+            y += dy
+    return x, y
+
+class Interpolator:
+    """
+    Smooths remote entity positions between snapshots.
+    Each entity moves from its previous snapshot position towards the newest
+    one over roughly one snapshot interval, stepping through intermediate cells.
+    """
+    def __init__(self, default_interval=0.1):
+        self.interval = default_interval
+        self.last_arrival = None
+        self.tracks = {}  # {entity_id: (from_x, from_y, to_x, to_y, start_time)}
+
+    def update(self, entities, now=None):
+        now = time.monotonic() if now is None else now
+        if self.last_arrival is not None:
+            # Exponential moving average of the snapshot interval, clamped so a
+            # long pause does not make entities crawl.
+            measured = min(now - self.last_arrival, 0.5)
+            self.interval = 0.8 * self.interval + 0.2 * measured
+        self.last_arrival = now
+        tracks = {}
+        for key, entity in entities.items():
+            to_x = entity.get("x", 0)
+            to_y = entity.get("y", 0)
+            if key in self.tracks:
+                from_x, from_y = self.position(key, now)
+            else:
+                from_x, from_y = to_x, to_y
+            tracks[key] = (from_x, from_y, to_x, to_y, now)
+        self.tracks = tracks
+
+    def position(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        from_x, from_y, to_x, to_y, start = self.tracks[key]
+        if self.interval <= 0:
+            return to_x, to_y
+        t = min(1.0, max(0.0, (now - start) / self.interval))
+        return (round(from_x + (to_x - from_x) * t),
+                round(from_y + (to_y - from_y) * t))
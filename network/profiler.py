@@ -0,0 +1,104 @@
+# network/profiler.py
+import threading
+import time
+from collections import deque
+
+# "idle" is time spent blocked waiting for a key; it is reported but left
+# out of the frame time, so a slow frame stands out from an idle one.
+IDLE_STAGE = "idle"
+STAGES = (IDLE_STAGE, "input", "sync", "map", "entities", "ui", "refresh")
+
+def average(values):
+    return sum(values) / len(values) if values else 0.0
+
+class FrameProfiler:
+    """
+    Rolling client-side timings for diagnosing lag:
+      - busy frame time (excluding idle) and time per stage (see STAGES),
+      - snapshot arrival rate, size and age (fed by the network thread),
+      - round-trip latency from ping/pong frames.
+    Optionally writes one CSV row per frame to a trace file.
+    """
+    def __init__(self, window=120):
+        self.frame_times = deque(maxlen=window)
+        self.stage_times = {stage: deque(maxlen=window) for stage in STAGES}
+        self.snapshots = deque(maxlen=window)  # (arrival time, size in bytes)
+        self.round_trips = deque(maxlen=20)
+        self.frame_count = 0
+        self.frame_start = None
+        self.last_mark = None
+        self.current = {}
+        self.trace_file = None
+        self.lock = threading.Lock()  # Snapshots and pongs arrive on the network thread.
+
+    def begin_frame(self):
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.current = {}
+
+    def mark(self, stage):
+        """Attribute the time since the previous mark to `stage`."""
+        now = time.perf_counter()
+        self.current[stage] = self.current.get(stage, 0.0) + now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self):
+        total = time.perf_counter() - self.frame_start - self.current.get(IDLE_STAGE, 0.0)
+        self.frame_count += 1
+        self.frame_times.append(total)
+        for stage in STAGES:
+            self.stage_times[stage].append(self.current.get(stage, 0.0))
+        if self.trace_file is not None:
+            stages = ",".join(f"{self.current.get(stage, 0.0) * 1000:.3f}" for stage in STAGES)
+            age = self.snapshot_age()
+            age_ms = "" if age is None else f"{age * 1000:.1f}"
+            self.trace_file.write(f"{self.frame_count},{self.frame_start:.6f},{total * 1000:.3f},{stages},{age_ms}\n")
+
+    def record_snapshot(self, size):
+        with self.lock:
+            self.snapshots.append((time.perf_counter(), size))
+
+    def record_pong(self, sent_at):
+        with self.lock:
+            self.round_trips.append(time.perf_counter() - sent_at)
+
+    def snapshot_rate(self):
+        with self.lock:
+            if len(self.snapshots) < 2:
+                return 0.0
+            span = self.snapshots[-1][0] - self.snapshots[0][0]
+            return (len(self.snapshots) - 1) / span if span > 0 else 0.0
+
+    def snapshot_age(self):
+        with self.lock:
+            if not self.snapshots:
+                return None
+            return time.perf_counter() - self.snapshots[-1][0]
+
+    def summary_lines(self):
+        """Short lines for the UI panel overlay."""
+        lines = []
+        frame_ms = average(self.frame_times) * 1000
+        worst_ms = max(self.frame_times, default=0.0) * 1000
+        lines.append(f"Frame: {frame_ms:.1f}ms (max {worst_ms:.1f})")
+        for stage in STAGES:
+            lines.append(f" {stage:<9}{average(self.stage_times[stage]) * 1000:6.2f}ms")
+        with self.lock:
+            size = average([s for _, s in self.snapshots])
+            rtt = average(self.round_trips) * 1000 if self.round_trips else None
+        age = self.snapshot_age()
+        lines.append(f"Snaps: {self.snapshot_rate():.1f}/s {size / 1024:.1f}KB")
+        lines.append(f"Snap age: {'-' if age is None else f'{age * 1000:.0f}ms'}")
+        lines.append(f"RTT: {'-' if rtt is None else f'{rtt:.0f}ms'}")
+        if self.trace_file is not None:
+            lines.append("Tracing to file")
+        return lines
+
+    def start_trace(self, path):
+        self.stop_trace()
+        self.trace_file = open(path, "w")
+        self.trace_file.write("frame,start,busy_ms," + ",".join(f"{s}_ms" for s in STAGES) + ",snapshot_age_ms\n")
+
+    def stop_trace(self):
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
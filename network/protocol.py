@@ -0,0 +1,123 @@
+# network/protocol.py
+# Helpers for the newline-delimited JSON wire format shared by client and server.
+#
+# Handshake: the client's first line is {"hello": {...}}. The server answers
+# with an uncompressed {"hello": {"compress": params or null}} line; if
+# compression was negotiated, every later byte from the server is one zlib
+# stream, sync-flushed after each frame.
+import json
+import zlib
+
+# Upper bound on steps in one movement command; longer paths are rejected.
+MAX_PATH_STEPS = 32
+
+# Server-side zlib level for negotiated compression (0-9).
+COMPRESSION_LEVEL = 6
+
+# Preset dictionary for state frames: strings that recur in every snapshot,
+# most frequent last (zlib prefers matches near the end of the dictionary).
+ZDICT = (
+    b'{"chunks": {"v": , "tiles": [["welcome": "handoff": '
+    b'"map_seed": , "version": "objects": {"enemies": {"players": {'
+    b'"127.0.0.1", "seq": , "hp": 5}, "enemy_, "char": "E", "hp": 3}, '
+    b'{"x": , "y": , "char": "@", "obj_, "char": "T", "type": "tree"}, "obj_'
+)
+
+UNIT_STEPS = {(0, -1), (0, 1), (-1, 0), (1, 0)}
+
+def encode_path(steps):
+    """
+    Run-length encode a list of (dx, dy) unit steps as [[dx, dy, count], ...].
+    e.g. [(1, 0), (1, 0), (0, 1)] -> [[1, 0, 2], [0, 1, 1]]
+    """
+    runs = []
+    for dx, dy in steps:
+        if runs and runs[-1][0] == dx and runs[-1][1] == dy:
+            runs[-1][2] += 1
+        else:
+            runs.append([dx, dy, 1])
+    return runs
+
+def decode_path(runs):
+    """
+    Expand and validate a run-length path from a client.
+    Returns a list of (dx, dy) unit steps, or None if the path is malformed
+    or longer than MAX_PATH_STEPS.
+    """
+    if not isinstance(runs, list):
+        return None
+    steps = []
+    for run in runs:
+        if not isinstance(run, list) or len(run) != 3:
+            return None
+        dx, dy, count = run
+        if (dx, dy) not in UNIT_STEPS or not isinstance(count, int) or count < 1:
+            return None
+        if len(steps) + count > MAX_PATH_STEPS:
+            return None
+        steps.extend([(dx, dy)] * count)
+    return steps
+
+def encode_frame(message):
+    """Serialize one message as a newline-terminated JSON frame."""
+    return (json.dumps(message) + "\n").encode()
+
+def read_line(sock):
+    """Read one newline-terminated line; returns (line, leftover) or (None, "")."""
+    buffer = b""
+    while b"\n" not in buffer:
+        data = sock.recv(1024)
+        if not data:
+            return None, ""
+        buffer += data
+    line, rest = buffer.split(b"\n", 1)
+    return line.decode(), rest.decode()
+
+def negotiate_compression(hello):
+    """
+    Server side: compression parameters to use for a client's hello, or None.
+    The client asks with {"compress": true} or {"compress": {"zdict": true}}.
+    """
+    requested = (hello or {}).get("compress")
+    if not requested or COMPRESSION_LEVEL <= 0:
+        return None
+    zdict = isinstance(requested, dict) and bool(requested.get("zdict"))
+    return {"level": COMPRESSION_LEVEL, "zdict": zdict}
+
+def make_compressor(params):
+    if params["zdict"]:
+        return zlib.compressobj(params["level"], zlib.DEFLATED, zlib.MAX_WBITS, zdict=ZDICT)
+    return zlib.compressobj(params["level"])
+
+def make_decompressor(params):
+    if params["zdict"]:
+        return zlib.decompressobj(zlib.MAX_WBITS, zdict=ZDICT)
+    return zlib.decompressobj()
+
+class FrameReader:
+    """
+    Client side: splits the server's byte stream into lines, switching to
+    zlib decompression after the hello reply if it negotiated compression.
+    """
+    def __init__(self):
+        self.buffer = b""
+        self.decompressor = None
+        self.handshake_done = False
+
+    def feed(self, data):
+        """Add received bytes; returns the complete lines (bytes) now available."""
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+        self.buffer += data
+        lines = []
+        while b"\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            if not self.handshake_done:
+                self.handshake_done = True
+                params = json.loads(line).get("hello", {}).get("compress")
+                if params:
+                    self.decompressor = make_decompressor(params)
+                    rest, self.buffer = self.buffer, b""
+                    self.buffer = self.decompressor.decompress(rest)
+            lines.append(line)
+        return lines
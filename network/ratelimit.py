@@ -0,0 +1,43 @@
+# network/ratelimit.py
+import time
+
+# Sustained commands per second and burst size, per client and command type.
+COMMAND_RATES = {
+    "move": (20.0, 40),
+    "build": (5.0, 10),
+    "attack": (2.0, 5),
+    "sync": (10.0, 20),
+    "ping": (2.0, 5),
+}
+# Overall limit per client across all command types.
+CLIENT_RATE = (40.0, 80)
+
+class TokenBucket:
+    """Allows `rate` events per second on average, with bursts of up to `burst`."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_take(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+class CommandLimiter:
+    """Per-client limiter: one bucket for the client plus one per command type."""
+    def __init__(self, rates=COMMAND_RATES, client_rate=CLIENT_RATE):
+        self.client_bucket = TokenBucket(*client_rate)
+        self.buckets = {kind: TokenBucket(*rate) for kind, rate in rates.items()}
+
+    def allow(self, kind):
+        now = time.monotonic()
+        bucket = self.buckets.get(kind)
+        if bucket is not None and not bucket.try_take(now):
+            return False
+        return self.client_bucket.try_take(now)
@@ -0,0 +1,227 @@
+# network/recording.py
+# Compact append-only log of everything that changes a session's world, for
+# deterministic replay (see network/replay.py).
+#
+# Layout: a header (magic, format version, map seed, world size, enemy
+# count), then records of a fixed prefix <tick, code, client slot> and a
+# per-code payload.
+# Clients are numbered with small slots; a CONNECT record carries the client
+# id and starting player state, DISCONNECT frees the slot. Commands use compact
+# binary payloads when they are in the usual shape and fall back to their
+# JSON text (RAW) otherwise, so a replay always sees the same commands.
+# Every CHECKPOINT_TICKS ticks, and when recording stops, a CHECKPOINT record
+# stores a hash of the world so a replay can verify it reproduced the game.
+#
+# A command stamped with tick T was applied after the tick counter reached T
+# and before that tick's enemy update (GameSession.advance_tick).
+import hashlib
+import json
+import struct
+from network.protocol import decode_path
+
+MAGIC = b"TTGR"
+FORMAT_VERSION = 2  # 2: snapshots (and so checkpoint hashes) include the map size.
+CHECKPOINT_TICKS = 100
+
+HEADER = struct.Struct("<4sBqIIH")    # magic, format version, map seed, width, height, enemies
+RECORD = struct.Struct("<IBH")        # tick, code, client slot
+PLAYER = struct.Struct("<iihiI")      # x, y, hp, seq, char code point
+MOVE = struct.Struct("<Bi")           # has seq, seq
+RUN = struct.Struct("<bbB")           # dx, dy, count
+BUILD = struct.Struct("<ii")          # x, y (+ block as a short string)
+ATTACK = struct.Struct("<iii")        # dx, dy, damage
+CHUNK = struct.Struct("<iI")          # chunk index, known version
+LENGTH8 = struct.Struct("<B")
+LENGTH16 = struct.Struct("<H")
+
+# Record codes.
+CONNECT = 1
+DISCONNECT = 2
+MOVE_COMMAND = 3
+BUILD_COMMAND = 4
+ATTACK_COMMAND = 5
+SYNC_COMMAND = 6
+PING_COMMAND = 7
+RAW_COMMAND = 8
+CHECKPOINT = 9
+
+def state_hash(session):
+    """SHA-256 of a session's world: snapshot tables, tick and built blocks."""
+    state = session.world.snapshot.to_dict()
+    state["tick"] = session.tick
+    state["blocks"] = {}
+    for chunk_index in session.world_map.overlay_versions:
+        version, tiles = session.world_map.overlay_tiles(chunk_index)
+        state["blocks"][str(chunk_index)] = [version, sorted(tiles)]
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).digest()
+
+def pack_string(text, length):
+    data = text.encode()
+    return length.pack(len(data)) + data
+
+def is_int32(value):
+    return type(value) is int and -2**31 <= value < 2**31
+
+def encode_command(message):
+    """(code, payload) for a command; anything unusual is kept as JSON."""
+    if "ping" in message:
+        return PING_COMMAND, b""  # The timestamp only matters to the client.
+    keys = set(message)
+    try:
+        if keys == {"sync_chunks"}:
+            chunks = message["sync_chunks"]
+            payload = LENGTH16.pack(len(chunks))
+            for key, version in chunks.items():
+                if str(int(key)) != key:
+                    raise ValueError(key)
+                payload += CHUNK.pack(int(key), version)
+            return SYNC_COMMAND, payload
+        if message.get("build") is True and keys <= {"build", "x", "y", "block"}:
+            x, y, block = message.get("x", 0), message.get("y", 0), message.get("block", "")
+            if is_int32(x) and is_int32(y) and isinstance(block, str):
+                return BUILD_COMMAND, BUILD.pack(x, y) + pack_string(block, LENGTH8)
+        if message.get("attack") is True and keys <= {"attack", "dx", "dy", "damage"}:
+            fields = (message.get("dx", 0), message.get("dy", 0), message.get("damage", 1))
+            if all(is_int32(value) for value in fields):
+                return ATTACK_COMMAND, ATTACK.pack(*fields)
+        if "path" in message and keys <= {"path", "seq"} and decode_path(message["path"]) is not None:
+            seq = message.get("seq")
+            if seq is None or is_int32(seq):
+                payload = MOVE.pack(seq is not None, seq or 0) + LENGTH8.pack(len(message["path"]))
+                for run in message["path"]:
+                    payload += RUN.pack(*run)
+                return MOVE_COMMAND, payload
+    except (struct.error, AttributeError, TypeError, ValueError):
+        pass
+    return RAW_COMMAND, pack_string(json.dumps(message), LENGTH16)
+
+class CommandRecorder:
+    """
+    Writes a session's command log. Callers hold the session's world.lock, so
+    records are in the order their effects were applied to the world.
+    """
+    def __init__(self, path, map_seed, world_width, world_height, enemy_count):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, map_seed, world_width, world_height,
+                                    enemy_count))
+        self.slots = {}      # {client_id: slot}
+        self.free_slots = []
+        self.next_slot = 0
+        self.records = 0
+
+    def write(self, tick, code, slot, payload=b""):
+        self.file.write(RECORD.pack(tick, code, slot) + payload)
+        self.records += 1
+
+    def connect(self, tick, client_id, player):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = self.next_slot
+            self.next_slot += 1
+        self.slots[client_id] = slot
+        fields = PLAYER.pack(player["x"], player["y"], player["hp"], player.get("seq", 0),
+                             ord(player["char"]))
+        self.write(tick, CONNECT, slot, fields + pack_string(client_id, LENGTH8))
+
+    def disconnect(self, tick, client_id):
+        slot = self.slots.pop(client_id, None)
+        if slot is not None:
+            self.write(tick, DISCONNECT, slot)
+            self.free_slots.append(slot)
+
+    def command(self, tick, client_id, message):
+        slot = self.slots.get(client_id)
+        if slot is not None:
+            code, payload = encode_command(message)
+            self.write(tick, code, slot, payload)
+
+    def checkpoint(self, tick, digest):
+        self.write(tick, CHECKPOINT, 0, digest)
+        self.file.flush()
+
+    def close(self, tick, digest):
+        self.checkpoint(tick, digest)
+        self.file.close()
+
+# ---------------------------------------------------------------------------
+# Reading
+
+class LogReader:
+    """Iterates over a command log's records as (tick, code, slot, value)."""
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        (magic, version, self.map_seed, self.world_width, self.world_height,
+         self.enemy_count) = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} command log")
+        self.truncated = False  # Set if the log ends mid-record (e.g. the server was killed).
+
+    def __iter__(self):
+        offset = HEADER.size
+        while offset < len(self.data):
+            try:
+                tick, code, slot = RECORD.unpack_from(self.data, offset)
+                offset, value = self.decode(code, offset + RECORD.size)
+            except (struct.error, UnicodeDecodeError, ValueError):
+                self.truncated = True
+                return
+            yield tick, code, slot, value
+
+    def string(self, offset, length):
+        (size,) = length.unpack_from(self.data, offset)
+        offset += length.size
+        if offset + size > len(self.data):
+            raise ValueError("truncated string")
+        return offset + size, self.data[offset:offset + size].decode()
+
+    def decode(self, code, offset):
+        """(next offset, value) for one record's payload."""
+        data = self.data
+        if code == CONNECT:
+            x, y, hp, seq, char = PLAYER.unpack_from(data, offset)
+            offset, client_id = self.string(offset + PLAYER.size, LENGTH8)
+            return offset, (client_id, {"x": x, "y": y, "char": chr(char), "hp": hp, "seq": seq})
+        if code == DISCONNECT:
+            return offset, None
+        if code == MOVE_COMMAND:
+            has_seq, seq = MOVE.unpack_from(data, offset)
+            offset += MOVE.size
+            (run_count,) = LENGTH8.unpack_from(data, offset)
+            offset += LENGTH8.size
+            path = []
+            for _ in range(run_count):
+                path.append(list(RUN.unpack_from(data, offset)))
+                offset += RUN.size
+            message = {"path": path}
+            if has_seq:
+                message["seq"] = seq
+            return offset, message
+        if code == BUILD_COMMAND:
+            x, y = BUILD.unpack_from(data, offset)
+            offset, block = self.string(offset + BUILD.size, LENGTH8)
+            return offset, {"build": True, "x": x, "y": y, "block": block}
+        if code == ATTACK_COMMAND:
+            dx, dy, damage = ATTACK.unpack_from(data, offset)
+            return offset + ATTACK.size, {"attack": True, "dx": dx, "dy": dy, "damage": damage}
+        if code == SYNC_COMMAND:
+            (count,) = LENGTH16.unpack_from(data, offset)
+            offset += LENGTH16.size
+            chunks = {}
+            for _ in range(count):
+                chunk_index, version = CHUNK.unpack_from(data, offset)
+                chunks[str(chunk_index)] = version
+                offset += CHUNK.size
+            return offset, {"sync_chunks": chunks}
+        if code == PING_COMMAND:
+            return offset, {"ping": 0}
+        if code == RAW_COMMAND:
+            offset, text = self.string(offset, LENGTH16)
+            return offset, json.loads(text)
+        if code == CHECKPOINT:
+            if offset + 32 > len(data):
+                raise ValueError("truncated checkpoint")
+            return offset + 32, data[offset:offset + 32]
+        raise ValueError(f"unknown record code {code}")
@@ -0,0 +1,179 @@
+# network/relay.py
+# Spectator relay: a single read-only connection to a game server, fanned out
+# to any number of viewers, so watching a game costs the server nothing extra.
+#   - Upstream, the relay joins with {"hello": {"spectator": true, ...}} and
+#     receives state snapshots and chunk overlays like a player would.
+#   - A viewer gets the latest full snapshot and every known chunk overlay
+#     when it joins, then one {"delta": ...} frame (see network/delta.py) per
+#     new snapshot and chunk frames as they arrive.
+#   - If the server connection drops, viewers get {"chunks": {}, "reset": true}
+#     and should forget the overlays they have, then a full snapshot once the
+#     relay is back.
+# Viewers use the client's spectator mode: run_client(..., spectator=True).
+# Run with: python -m network.relay --server 127.0.0.1 --session default
+import argparse
+import json
+import socket
+import threading
+import time
+from network import server
+from network.connection import ClientConnection
+from network.delta import diff_state
+from network.protocol import FrameReader, encode_frame, read_line
+from network.ratelimit import COMMAND_RATES, TokenBucket
+from network.session import MAX_LINE_BYTES, accept_hello
+
+RELAY_PORT = 12400
+RECONNECT_SECONDS = 1.0
+UPSTREAM_COMPRESSION = {"zdict": True}
+
+class SpectatorRelay:
+    """Mirrors one session's state from upstream and fans it out to viewers."""
+    def __init__(self, server_host, server_port, session=server.DEFAULT_SESSION):
+        self.server_host = server_host
+        self.server_port = server_port
+        self.session = session
+        self.state = None        # Latest state dict from upstream; None until (re)connected.
+        self.state_frame = None  # That state as a full frame, for joining viewers.
+        self.chunks = {}         # {chunk_index (str): {"v": version, "tiles": [...]}}
+        self.viewers = []        # ClientConnections
+        self.awaiting_state = set()  # Viewers that joined before any snapshot arrived.
+        # Held while fanning out and while a viewer joins, so a new viewer's
+        # first delta is always based on the snapshot it was sent.
+        self.lock = threading.Lock()
+
+    def upstream_loop(self):
+        hello = {"session": self.session, "spectator": True, "compress": UPSTREAM_COMPRESSION}
+        while True:
+            connected = False
+            try:
+                sock = socket.create_connection((self.server_host, self.server_port))
+                connected = True
+                sock.sendall(encode_frame({"hello": hello}))
+                print(f"[RELAY] Watching session {self.session} on {self.server_host}:{self.server_port}")
+                reader = FrameReader()
+                while True:
+                    data = sock.recv(65536)
+                    if not data:
+                        break
+                    for line in reader.feed(data):
+                        self.handle_upstream(line)
+                sock.close()
+            except Exception as e:
+                print(f"[RELAY] Upstream error: {e}")
+            if connected:
+                with self.lock:
+                    # A restarted server numbers its overlays from scratch:
+                    # drop ours and have viewers drop theirs. The next
+                    # snapshot goes out in full.
+                    self.state = None
+                    self.chunks = {}
+                    self.fan_out(encode_frame({"chunks": {}, "reset": True}))
+            time.sleep(RECONNECT_SECONDS)
+
+    def handle_upstream(self, line):
+        message = json.loads(line)
+        if "chunks" in message:
+            with self.lock:
+                for chunk_index, overlay in message["chunks"].items():
+                    known = self.chunks.get(chunk_index)
+                    if known is None or overlay["v"] > known["v"]:
+                        self.chunks[chunk_index] = overlay
+                self.fan_out(line + b"\n")
+        elif "players" in message:
+            with self.lock:
+                full_frame = line + b"\n"
+                if self.state is None:
+                    frame = full_frame
+                else:
+                    frame = encode_frame({"delta": diff_state(self.state, message)})
+                self.state = message
+                self.state_frame = full_frame
+                self.fan_out(frame, full_frame)
+                self.awaiting_state.clear()
+        elif "error" in message:
+            print(f"[RELAY] Server refused us: {message['error']}")
+
+    def fan_out(self, frame, full_frame=None):
+        # Caller holds self.lock. Viewers still waiting for their first
+        # snapshot get `full_frame` instead. Viewers too slow to keep up are
+        # dropped by their connection's send budget.
+        for viewer in list(self.viewers):
+            if full_frame is not None and viewer in self.awaiting_state:
+                sent = viewer.send(full_frame)
+            else:
+                sent = viewer.send(frame)
+            if not sent:
+                self.viewers.remove(viewer)
+                self.awaiting_state.discard(viewer)
+
+    def serve_viewer(self, conn, addr):
+        try:
+            line, buffer = read_line(conn)
+        except OSError:
+            line = None
+        if line is None:
+            conn.close()
+            return
+        try:
+            hello = json.loads(line).get("hello")
+        except Exception:
+            hello = None
+        if hello is not None and not isinstance(hello, dict):
+            server.reject(conn, "invalid hello")
+            return
+        viewer = ClientConnection(conn, addr)
+        accept_hello(viewer, hello or {})
+        with self.lock:
+            if self.chunks:
+                viewer.send(encode_frame({"chunks": dict(self.chunks)}))
+            if self.state_frame is not None:
+                viewer.send(self.state_frame)
+            else:
+                self.awaiting_state.add(viewer)
+            self.viewers.append(viewer)
+            watching = len(self.viewers)
+        print(f"[RELAY] Viewer {addr} joined ({watching} watching)")
+        # Viewers are read-only; only pings (for the profiler) are answered.
+        pings = TokenBucket(*COMMAND_RATES["ping"])
+        try:
+            while True:
+                if "\n" not in buffer:
+                    if len(buffer) > MAX_LINE_BYTES:
+                        break
+                    data = conn.recv(1024)
+                    if not data:
+                        break
+                    buffer += data.decode()
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    try:
+                        message = json.loads(line)
+                    except Exception:
+                        continue
+                    if isinstance(message, dict) and "ping" in message and pings.try_take():
+                        viewer.send(encode_frame({"pong": message["ping"]}))
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                if viewer in self.viewers:
+                    self.viewers.remove(viewer)
+                self.awaiting_state.discard(viewer)
+            print(f"[RELAY] Viewer {addr} left")
+            viewer.close()
+            conn.close()
+
+def relay_main(server_host, server_port=server.PORT, session=server.DEFAULT_SESSION, port=RELAY_PORT):
+    relay = SpectatorRelay(server_host, server_port, session)
+    threading.Thread(target=relay.upstream_loop, daemon=True).start()
+    server.serve(server.HOST, port, relay.serve_viewer)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relay a game session to read-only viewers.")
+    parser.add_argument("--server", default="127.0.0.1")
+    parser.add_argument("--server-port", type=int, default=server.PORT)
+    parser.add_argument("--session", default=server.DEFAULT_SESSION)
+    parser.add_argument("--port", type=int, default=RELAY_PORT)
+    args = parser.parse_args()
+    relay_main(args.server, args.server_port, args.session, args.port)
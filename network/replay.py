@@ -0,0 +1,114 @@
+# network/replay.py
+# Re-runs a recorded command log (see network/recording.py) through the game
+# logic headlessly and as fast as possible: no sockets, no tick timer. Checks
+# each recorded world hash against the replayed world and reports time spent
+# per command type, which makes real play a reproducible profiling workload.
+# Run with: python -m network.replay recordings/default_20260101_120000.ttgrec
+import argparse
+import cProfile
+import pstats
+import sys
+import time
+from collections import Counter
+from network import recording
+from network.session import GameSession, command_type
+
+class NullConnection:
+    """Stands in for a client connection: frames sent to it are counted and dropped."""
+    def __init__(self):
+        self.frames = 0
+
+    def send(self, data):
+        self.frames += 1
+        return True
+
+    def send_state(self, data, version=None):
+        return self.send(data)
+
+class ReplayResult:
+    def __init__(self):
+        self.counts = Counter()    # {kind: records replayed}
+        self.seconds = Counter()   # {kind: total seconds}
+        self.errors = Counter()    # {kind: commands that raised}
+        self.checkpoints = 0
+        self.mismatches = []       # Ticks whose checkpoint hash did not match.
+        self.ticks = 0
+        self.wall_seconds = 0.0
+        self.final_hash = None
+
+def replay(path):
+    """Replay the log at `path`; returns (session, ReplayResult)."""
+    log = recording.LogReader(path)
+    session = GameSession("replay", log.world_width, log.world_height, seed=log.map_seed,
+                          enemy_count=log.enemy_count)
+    clients = {}  # {slot: (client_id, NullConnection)}
+    result = ReplayResult()
+    clock = time.perf_counter
+    start = clock()
+    for tick, code, slot, value in log:
+        while session.tick < tick:
+            tick_start = clock()
+            session.advance_tick()
+            result.seconds["tick"] += clock() - tick_start
+            result.counts["tick"] += 1
+        if code == recording.CHECKPOINT:
+            result.checkpoints += 1
+            if recording.state_hash(session) != value:
+                result.mismatches.append(tick)
+            continue
+        command_start = clock()
+        if code == recording.CONNECT:
+            client_id, player = value
+            clients[slot] = (client_id, NullConnection())
+            session.join_player(client_id, player)
+            kind = "connect"
+        elif code == recording.DISCONNECT:
+            client_id, _ = clients.pop(slot)
+            session.remove_player(client_id)
+            kind = "disconnect"
+        else:
+            client_id, client = clients[slot]
+            kind = command_type(value)
+            try:
+                session.apply_command(client, client_id, value)
+            except Exception:
+                result.errors[kind] += 1  # The live server logged and skipped these too.
+        result.seconds[kind] += clock() - command_start
+        result.counts[kind] += 1
+    result.wall_seconds = clock() - start
+    result.ticks = session.tick
+    result.final_hash = recording.state_hash(session)
+    if log.truncated:
+        print(f"[REPLAY] {path} ends with an incomplete record; replayed up to it")
+    return session, result
+
+def print_report(path, session, result):
+    commands = sum(n for kind, n in result.counts.items() if kind != "tick")
+    print(f"Replayed {path}: map seed {session.map_seed}, {result.ticks} ticks, "
+          f"{commands} records in {result.wall_seconds:.3f}s")
+    print(f"  {'type':<12}{'count':>9}{'total ms':>11}{'avg us':>9}{'errors':>8}")
+    for kind, seconds in result.seconds.most_common():
+        count = result.counts[kind]
+        print(f"  {kind:<12}{count:>9}{seconds * 1000:>11.2f}{seconds / count * 1e6:>9.1f}"
+              f"{result.errors[kind]:>8}")
+    if result.mismatches:
+        print(f"  Checkpoints: {result.checkpoints}, MISMATCHED at ticks {result.mismatches[:10]}")
+    else:
+        print(f"  Checkpoints: {result.checkpoints}, all matched")
+    print(f"  Final state hash: {result.final_hash.hex()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded command log headlessly.")
+    parser.add_argument("log")
+    parser.add_argument("--profile", action="store_true", help="also print a cProfile summary")
+    args = parser.parse_args()
+    profile = cProfile.Profile() if args.profile else None
+    if profile is not None:
+        profile.enable()
+    session, result = replay(args.log)
+    if profile is not None:
+        profile.disable()
+    print_report(args.log, session, result)
+    if profile is not None:
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(25)
+    sys.exit(1 if result.mismatches else 0)
@@ -1,151 +1,159 @@
 # network/server.py
+import argparse
+import os
+import re
 import socket
 import threading
 import json
 import time
 import random
-from game.map import InfiniteGameMap
-from game.enemy import spawn_enemies, spawn_objects
+from network.protocol import encode_frame, read_line
+from network.session import GameSession
 
 HOST = '0.0.0.0'
 PORT = 12345
+DEFAULT_SESSION = "default"
+MAX_SESSIONS = 32
+MAX_SESSION_NAME = 64
+MAX_SEED = 2**31 - 1
 
-players = {}     # {client_id: {"x": int, "y": int, "char": str, "hp": int}}
-enemies = {}     # {enemy_id: {...}}
-objects = {}     # {object_id: {...}}
-custom_tiles = {}  # {(x,y): {"x": x, "y": y, "block": str, "char": str}}
-connections = []  # List of connected client sockets
-state_lock = threading.Lock()
+# One process hosts many independent game sessions on one port. A client
+# picks one with its first line, {"hello": {"session": name}}; a session that
+# does not exist yet is created (with the given "seed", if any). With
+# "spectator": true the connection only watches (see network/relay.py).
+# A session other than the default one is removed once its last connection
+# leaves; MAX_SESSIONS limits those extra sessions.
+sessions = {}  # {name: GameSession}
+session_members = {}  # {name: connections using the session, joined or joining}
+sessions_lock = threading.Lock()
+world_size = None  # (width, height) for sessions created on demand.
+record_dir = None  # If set, every session records a command log here (see network/replay.py).
 
-map_seed = random.randint(0, 1000000)
-world_map = None
+map_seed = random.randint(0, 1000000)  # Seed of the default session.
 
-def broadcast_state():
-    with state_lock:
-        state = json.dumps({
-            "players": players,
-            "enemies": enemies,
-            "objects": objects,
-            "custom_tiles": custom_tiles,
-            "map_seed": map_seed
-        }) + "\n"
-        for conn in connections.copy():
-            try:
-                conn.sendall(state.encode())
-            except Exception:
-                if conn in connections:
-                    connections.remove(conn)
+def get_session(name, seed=None):
+    """
+    The session called `name`, created if needed; None if the server is full.
+    Each call counts as a member of the session until release_session().
+    """
+    with sessions_lock:
+        session = sessions.get(name)
+        if session is None:
+            if len(sessions) - (DEFAULT_SESSION in sessions) >= MAX_SESSIONS and name != DEFAULT_SESSION:
+                return None
+            world_width, world_height = world_size
+            record_path = None
+            if record_dir is not None:
+                safe_name = re.sub(r"[^\w-]", "_", name)
+                record_path = os.path.join(record_dir, f"{safe_name}_{time.strftime('%Y%m%d_%H%M%S')}.ttgrec")
+            session = GameSession(name, world_width, world_height, seed=seed, record_path=record_path)
+            session.start_simulation()
+            sessions[name] = session
+            print(f"[SERVER] Started session {name} with map seed: {session.map_seed}")
+        session_members[name] = session_members.get(name, 0) + 1
+        return session
 
-def handle_client(conn, addr):
-    client_id = str(addr)
-    print(f"[SERVER] New connection from {client_id}")
-    with state_lock:
-        players[client_id] = {"x": 5, "y": 5, "char": "@", "hp": 5}
-        connections.append(conn)
-    broadcast_state()
+def release_session(session):
+    """Drop one member of `session`; an empty session other than the default is removed."""
+    with sessions_lock:
+        session_members[session.name] -= 1
+        if session_members[session.name] > 0 or session.name == DEFAULT_SESSION:
+            return
+        del session_members[session.name]
+        del sessions[session.name]
+    session.stop()
+    print(f"[SERVER] Closed empty session {session.name}")
 
-    buffer = ""
+def reject(conn, reason):
     try:
-        while True:
-            data = conn.recv(1024)
-            if not data:
-                break
-            buffer += data.decode()
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                try:
-                    message = json.loads(line)
-                    if message.get("build", False):
-                        # Build command: x, y, and block type.
-                        x = message.get("x", 0)
-                        y = message.get("y", 0)
-                        block = message.get("block", "")
-                        # Check that the target cell is walkable (terrain) and not occupied.
-                        can_build = True
-                        if not world_map.is_walkable(x, y):
-                            can_build = False
-                        for p in players.values():
-                            if p["x"] == x and p["y"] == y:
-                                can_build = False
-                                break
-                        if can_build:
-                            # Save or update the custom tile.
-                            custom_tiles[(x, y)] = {"x": x, "y": y, "block": block, "char": block}
-                    elif message.get("attack", False):
-                        dx = message.get("dx", 0)
-                        dy = message.get("dy", 0)
-                        damage = message.get("damage", 1)
-                        with state_lock:
-                            if client_id in players:
-                                player = players[client_id]
-                                target_x = player["x"] + dx
-                                target_y = player["y"] + dy
-                                target_enemy = None
-                                for eid, enemy in list(enemies.items()):
-                                    if enemy["x"] == target_x and enemy["y"] == target_y:
-                                        target_enemy = eid
-                                        break
-                                if target_enemy:
-                                    enemies[target_enemy]["hp"] -= damage
-                                    print(f"[SERVER] {client_id} attacked enemy {target_enemy} for {damage} damage; remaining hp: {enemies[target_enemy]['hp']}")
-                                    if enemies[target_enemy]["hp"] <= 0:
-                                        print(f"[SERVER] Enemy {target_enemy} defeated.")
-                                        del enemies[target_enemy]
-                    else:
-                        dx = message.get("dx", 0)
-                        dy = message.get("dy", 0)
-                        with state_lock:
-                            if client_id in players:
-                                player = players[client_id]
-                                new_x = player["x"] + dx
-                                new_y = player["y"] + dy
-                                blocked = False
-                                if not world_map.is_walkable(new_x, new_y):
-                                    blocked = True
-                                if not blocked:
-                                    for enemy in enemies.values():
-                                        if enemy["x"] == new_x and enemy["y"] == new_y:
-                                            blocked = True
-                                            break
-                                if not blocked:
-                                    for obj in objects.values():
-                                        if obj["x"] == new_x and obj["y"] == new_y:
-                                            blocked = True
-                                            break
-                                if not blocked:
-                                    player["x"] = new_x
-                                    player["y"] = new_y
-                except Exception as e:
-                    print(f"[SERVER] Error processing message from {client_id}: {e}")
-            broadcast_state()
-    finally:
-        with state_lock:
-            print(f"[SERVER] Connection closed: {client_id}")
-            if conn in connections:
-                connections.remove(conn)
-            if client_id in players:
-                del players[client_id]
-        broadcast_state()
+        conn.sendall(encode_frame({"error": reason}))
+    except OSError:
+        pass
+    conn.close()
+
+def accept_client(conn, addr):
+    try:
+        line, buffer = read_line(conn)
+    except OSError:
+        line = None
+    if line is None:
         conn.close()
+        return
+    try:
+        hello = json.loads(line).get("hello")
+    except Exception:
+        hello = None
+    if hello is None:
+        # Not a handshake: treat the line as the first command for the default session.
+        buffer = line + "\n" + buffer
+    elif not isinstance(hello, dict):
+        reject(conn, "invalid hello")
+        return
+    options = hello or {}
+    name = options.get("session", DEFAULT_SESSION)
+    seed = options.get("seed")
+    if not isinstance(name, str) or not name or len(name) > MAX_SESSION_NAME:
+        reject(conn, "invalid session name")
+        return
+    if seed is not None and (type(seed) is not int or not 0 <= seed <= MAX_SEED):
+        reject(conn, f"seed must be an integer from 0 to {MAX_SEED}")
+        return
+    try:
+        session = get_session(name, seed)
+    except Exception as e:
+        print(f"[SERVER] Could not start session {name}: {e}")
+        reject(conn, "could not start session")
+        return
+    if session is None:
+        reject(conn, "server is full")
+        return
+    try:
+        if options.get("spectator"):
+            session.handle_spectator(conn, addr, buffer=buffer, hello=hello)
+        else:
+            session.handle_client(conn, addr, buffer=buffer, hello=hello)
+    finally:
+        release_session(session)
 
-def server_main(world_width, world_height):
-    global world_map, enemies, objects
-    world_map = InfiniteGameMap(world_width, chunk_height=20, seed=map_seed)
-    enemies = spawn_enemies(world_width, world_height, seed=map_seed)
-    objects = spawn_objects(world_width, world_height, seed=map_seed, game_map=world_map)
+def serve(host, port, handler):
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
+    server.bind((host, port))
     server.listen(5)
-    print(f"[SERVER] Listening on port {PORT} with map seed: {map_seed}")
+    print(f"[SERVER] Listening on port {port}")
     try:
         while True:
             conn, addr = server.accept()
-            threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+            threading.Thread(target=handler, args=(conn, addr), daemon=True).start()
     except Exception as e:
         print(f"[SERVER] Error: {e}")
     finally:
         server.close()
 
-def start_server(world_width, world_height):
-    threading.Thread(target=server_main, args=(world_width, world_height), daemon=True).start()
+def server_main(world_width, world_height, record_to=None):
+    global world_size, record_dir
+    world_size = (world_width, world_height)
+    if record_to is not None:
+        os.makedirs(record_to, exist_ok=True)
+        record_dir = record_to
+    get_session(DEFAULT_SESSION, map_seed)
+    serve(HOST, PORT, accept_client)
+
+def stop_recordings():
+    with sessions_lock:
+        for session in sessions.values():
+            session.stop_recording()
+
+def start_server(world_width, world_height, record_to=None):
+    threading.Thread(target=server_main, args=(world_width, world_height, record_to), daemon=True).start()
     time.sleep(0.5)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a dedicated game server.")
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=24)
+    parser.add_argument("--record", metavar="DIR", help="record each session's commands to DIR")
+    args = parser.parse_args()
+    try:
+        server_main(args.width, args.height, args.record)
+    finally:
+        stop_recordings()
@@ -0,0 +1,664 @@
+# network/session.py
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from game.map import InfiniteGameMap
+from game.enemy import spawn_enemies, spawn_objects
+from game.entities import EntityStore, update_enemies
+from game.world import World, with_entity, without_entity
+from network.connection import ClientConnection
+from network.protocol import decode_path, encode_frame, negotiate_compression
+from network.ratelimit import CommandLimiter
+from network.recording import CHECKPOINT_TICKS, CommandRecorder, state_hash
+
+CHUNK_HEIGHT = 20
+TICK_SECONDS = 0.1   # Simulation tick for enemy behaviour.
+ENEMY_COUNT = 2      # Enemies spawned per world.
+
+# Work budgeting. Commands that pass a client's rate limits are queued and
+# applied at most COMMANDS_PER_TICK per client per tick; the rest wait for
+# later ticks. A client with MAX_PENDING_COMMANDS queued has new ones dropped.
+COMMANDS_PER_TICK = 8
+MAX_PENDING_COMMANDS = 64
+MAX_LINE_BYTES = 4096               # Longer lines from a client end its connection.
+MIN_BROADCAST_INTERVAL = 1.0 / 30   # Command-triggered broadcasts beyond this rate wait for the tick.
+METRICS_INTERVAL = 10.0             # Seconds between dropped/deferred command reports.
+
+def new_player():
+    return {"x": 5, "y": 5, "char": "@", "hp": 5, "seq": 0}
+
+def command_type(message):
+    """Rate-limit category of a decoded command (mirrors apply_command)."""
+    if "ping" in message:
+        return "ping"
+    if "sync_chunks" in message:
+        return "sync"
+    if message.get("build", False):
+        return "build"
+    if message.get("attack", False):
+        return "attack"
+    return "move"
+
+class PlayerLink:
+    """
+    Server-side state of one connected player: its rate limiter and the
+    commands that passed it but are still waiting for processing budget.
+    """
+    def __init__(self, client, client_id):
+        self.client = client
+        self.client_id = client_id
+        self.limiter = CommandLimiter()
+        self.pending = deque()  # [kind, message, counted_as_deferred]
+        self.lock = threading.Lock()  # Held by whichever thread is applying `pending`.
+        self.budget_tick = -1
+        self.budget_used = 0
+        self.handed_off = False
+
+def accept_hello(client, hello):
+    """Answer a client's hello, switching on compression if it was negotiated."""
+    params = negotiate_compression(hello)
+    client.send(encode_frame({"hello": {"compress": params}}))
+    if params:
+        client.enable_compression(params)
+
+class GameSession:
+    """
+    One independent game: its world, map, enemies and connected clients.
+    Many sessions can run in one server process; sessions with the same seed
+    share terrain through the map module's chunk cache.
+
+    Authoritative state lives in `world` as immutable snapshots:
+      players:  {client_id: {"x": int, "y": int, "char": str, "hp": int, "seq": int}}
+      enemies:  {"enemy_<id>": {...}}, produced from enemy_store
+      objects:  {object_id: {...}}
+    Command handlers take world.lock and publish a new version; readers
+    (serialization, broadcast) use world.snapshot without locking.
+    Built blocks live in world_map's per-chunk overlays instead: clients ask
+    for the chunks they can see ("sync_chunks") and are pushed a chunk's
+    overlay whenever its version changes.
+
+    Enemies are simulated in enemy_store (struct-of-arrays, see
+    game/entities.py) on a fixed tick; the enemies table of each snapshot is
+    derived from it. Both are only touched while holding world.lock.
+
+    Sharding (see network/shard.py): a shard worker's session owns the rows
+    in owned_rows = (first_row, end_row or None) and hands players that leave
+    them back to the front-end. border_ghosts and ghost_chunks hold
+    read-only copies of neighbouring shards' entities and built blocks near
+    our edges; collision checks use them, and they are merged into what our
+    clients see so the world looks seamless across a boundary.
+
+    With `record_path`, every change to the world (joins, leaves and applied
+    commands) is logged for replay; see network/recording.py.
+    """
+    def __init__(self, name, world_width, world_height, seed=None, owned_rows=None, record_path=None,
+                 enemy_count=None):
+        self.name = name
+        self.map_seed = seed if seed is not None else random.randint(0, 1000000)
+        enemy_count = ENEMY_COUNT if enemy_count is None else enemy_count
+        self.owned_rows = owned_rows
+        self.connections = []  # List of ClientConnection objects
+        self.connections_lock = threading.Lock()
+        self.chunk_subscriptions = {}  # {ClientConnection: set of chunk indices in view}
+        self.spectators = []     # Read-only ClientConnections; also in connections, pushed every chunk
+        self.border_ghosts = {}  # {peer_index: {"players": {...}, "enemies": {...}}}
+        self.ghost_chunks = {}   # {peer_index: {chunk_index: (version, tiles)}}
+        self.ghost_version = 0   # Bumped on every border_ghosts change; see client_state().
+        self.merged_state = None # (version, frame) cache for client_state()
+        self.peer_links = []     # [(ClientConnection, (first_row, end_row))] neighbours subscribed to our border
+        self.links = {}          # {client_id: PlayerLink}, guarded by connections_lock
+        self.tick = 0
+        self.running = True      # Cleared by stop() to end the tick loop.
+        self.sim_rng = random.Random(self.map_seed)
+        self.last_broadcast = 0.0
+        self.broadcast_pending = False
+        # Command counters by type: accepted, dropped (rate limited, queue
+        # full or malformed) and deferred to a later tick by the budget.
+        self.metrics = {"accepted": Counter(), "dropped": Counter(), "deferred": Counter()}
+        self.metrics_lock = threading.Lock()
+        self.metrics_reported = (0, 0)
+        self.last_metrics_report = time.monotonic()
+
+        self.world_map = InfiniteGameMap(world_width, chunk_height=CHUNK_HEIGHT, seed=self.map_seed)
+        enemies = spawn_enemies(world_width, world_height, seed=self.map_seed,
+                                count=enemy_count, game_map=self.world_map)
+        objects = spawn_objects(world_width, world_height, seed=self.map_seed, game_map=self.world_map)
+        self.object_cells = {(obj["x"], obj["y"]) for obj in objects.values()}
+        # A shard only simulates the enemies on its own rows.
+        self.enemy_store = EntityStore()
+        for enemy in enemies.values():
+            if self.owns_row(enemy["y"]):
+                self.enemy_store.spawn(enemy["x"], enemy["y"], enemy["hp"], enemy["char"])
+        self.world = World(self.map_seed, world_width, CHUNK_HEIGHT,
+                           enemies=self.enemy_store.to_wire(), objects=objects)
+        self.enemy_store.dirty.clear()
+        self.recorder = None
+        if record_path is not None:
+            self.recorder = CommandRecorder(record_path, self.map_seed, world_width, world_height,
+                                            enemy_count)
+            print(f"[SERVER] Recording session {name} to {record_path}")
+
+    def broadcast_state(self):
+        # Encoding happens outside any lock and only once per snapshot version.
+        snapshot = self.world.snapshot
+        state, version = self.client_state(snapshot)
+        with self.connections_lock:
+            targets = self.connections.copy()
+            links = self.peer_links.copy()
+        for client in targets:
+            if not client.send_state(state, version):
+                with self.connections_lock:
+                    if client in self.connections:
+                        self.connections.remove(client)
+        for link, rows in links:
+            border = encode_frame({"border": self.border_view(snapshot, rows)})
+            if not link.send_state(border, snapshot.version):
+                with self.connections_lock:
+                    if (link, rows) in self.peer_links:
+                        self.peer_links.remove((link, rows))
+
+    def owns_row(self, y):
+        if self.owned_rows is None:
+            return True
+        first_row, end_row = self.owned_rows
+        return y >= first_row and (end_row is None or y < end_row)
+
+    def border_view(self, snapshot, rows):
+        """Entities of `snapshot` whose y lies in [rows[0], rows[1])."""
+        first_row, end_row = rows
+        def in_rows(entity):
+            return first_row <= entity["y"] < end_row
+        return {
+            "players": {k: v for k, v in snapshot.players.items() if in_rows(v)},
+            "enemies": {k: v for k, v in snapshot.enemies.items() if in_rows(v)},
+        }
+
+    def ghost_entities(self, table):
+        """Iterate over the given table of every neighbouring shard's border copy."""
+        for ghosts in list(self.border_ghosts.values()):
+            yield from ghosts.get(table, {}).values()
+
+    def client_state(self, snapshot):
+        """
+        (frame, version) of the state sent to clients. On a shard worker this
+        is `snapshot` plus the neighbours' border entities, versioned by
+        snapshot.version + ghost_version so it still only ever increases.
+        """
+        if self.ghost_version == 0:
+            return snapshot.encode(), snapshot.version
+        version = snapshot.version + self.ghost_version
+        cached = self.merged_state
+        if cached is not None and cached[0] == version:
+            return cached[1], version
+        players = {}
+        enemies = {}
+        for peer, ghosts in list(self.border_ghosts.items()):
+            players.update(ghosts.get("players", {}))
+            # Enemy ids are per shard, so neighbours' keys are made unique.
+            for key, enemy in ghosts.get("enemies", {}).items():
+                enemies[f"shard{peer}_{key}"] = enemy
+        players.update(snapshot.players)
+        enemies.update(snapshot.enemies)
+        state = snapshot.to_dict()
+        state.update(players=players, enemies=enemies, version=version)
+        frame = encode_frame(state)
+        self.merged_state = (version, frame)
+        return frame, version
+
+    def update_ghosts(self, peer, ghosts):
+        """Store a neighbour's border entities (None when its link is lost)."""
+        if ghosts is None:
+            self.ghost_chunks.pop(peer, None)
+        if self.border_ghosts.get(peer) == ghosts:
+            return
+        if ghosts is None:
+            self.border_ghosts.pop(peer, None)
+        else:
+            self.border_ghosts[peer] = ghosts
+        self.ghost_version += 1
+        self.request_broadcast()
+
+    def update_ghost_chunks(self, peer, chunks):
+        """Store a neighbour's overlays of chunks near our edge and pass them on."""
+        known = self.ghost_chunks.setdefault(peer, {})
+        for key, overlay in chunks.items():
+            chunk_index = int(key)
+            if self.owns_chunk(chunk_index) or overlay["v"] <= known.get(chunk_index, (0,))[0]:
+                continue
+            known[chunk_index] = (overlay["v"], overlay["tiles"])
+            self.push_chunk(chunk_index)
+
+    def owns_chunk(self, chunk_index):
+        # Shard boundaries fall on chunk boundaries.
+        return self.owns_row(chunk_index * CHUNK_HEIGHT)
+
+    def overlay(self, chunk_index):
+        """(version, tiles) of a chunk's built blocks, ours or a neighbour's copy."""
+        if self.owns_chunk(chunk_index):
+            # Under the lock apply_build holds, so the tiles match the version.
+            with self.world.lock:
+                return self.world_map.overlay_tiles(chunk_index)
+        for chunks in list(self.ghost_chunks.values()):
+            if chunk_index in chunks:
+                return chunks[chunk_index]
+        return 0, []
+
+    def overlay_version(self, chunk_index):
+        if self.owns_chunk(chunk_index):
+            return self.world_map.overlay_versions.get(chunk_index, 0)
+        return self.overlay(chunk_index)[0]
+
+    def known_chunks(self):
+        """Indices of every chunk with built blocks that we can serve."""
+        with self.world.lock:
+            chunks = set(self.world_map.overlay_versions)
+        for ghosts in list(self.ghost_chunks.values()):
+            chunks.update(ghosts)
+        return chunks
+
+    def chunk_frame(self, chunk_indices):
+        """Frame carrying the current overlay of each given chunk."""
+        chunks = {}
+        for chunk_index in chunk_indices:
+            version, tiles = self.overlay(chunk_index)
+            chunks[str(chunk_index)] = {"v": version, "tiles": tiles}
+        return encode_frame({"chunks": chunks})
+
+    def apply_sync_chunks(self, client, message):
+        # {"sync_chunks": {chunk_index: known_version}} lists the chunks in the
+        # client's view; reply with the ones it is missing and push later changes.
+        known = {int(k): v for k, v in message["sync_chunks"].items()}
+        with self.connections_lock:
+            self.chunk_subscriptions[client] = set(known)
+        stale = [c for c, v in known.items() if self.overlay_version(c) != v]
+        if stale:
+            client.send(self.chunk_frame(stale))
+
+    def push_chunk(self, chunk_index):
+        frame = self.chunk_frame([chunk_index])
+        first_row = chunk_index * CHUNK_HEIGHT
+        with self.connections_lock:
+            targets = [c for c, chunks in self.chunk_subscriptions.items() if chunk_index in chunks]
+            targets += self.spectators
+            # Neighbours watching this chunk's rows get our own overlays too.
+            if self.owns_chunk(chunk_index):
+                targets += [link for link, rows in self.peer_links
+                            if first_row < rows[1] and rows[0] < first_row + CHUNK_HEIGHT]
+        for client in targets:
+            client.send(frame)
+
+    def apply_build(self, client_id, message):
+        # Build command: x, y, and block type.
+        x = message.get("x", 0)
+        y = message.get("y", 0)
+        block = message.get("block", "")
+        if not isinstance(block, str) or not block:
+            return
+        with self.world.lock:
+            snapshot = self.world.snapshot
+            # Check that the target cell is walkable (terrain), on our shard and not occupied.
+            if not self.world_map.is_walkable(x, y) or not self.owns_row(y):
+                return
+            for p in snapshot.players.values():
+                if p["x"] == x and p["y"] == y:
+                    return
+            for p in self.ghost_entities("players"):
+                if p["x"] == x and p["y"] == y:
+                    return
+            # Save or update the block in the chunk's overlay.
+            chunk_index = self.world_map.set_block(x, y, block)
+        self.push_chunk(chunk_index)
+
+    def apply_attack(self, client_id, message):
+        dx = message.get("dx", 0)
+        dy = message.get("dy", 0)
+        damage = message.get("damage", 1)
+        with self.world.lock:
+            snapshot = self.world.snapshot
+            if client_id not in snapshot.players:
+                return
+            player = snapshot.players[client_id]
+            target_enemy = self.enemy_store.at(player["x"] + dx, player["y"] + dy)
+            if target_enemy is not None:
+                hp = self.enemy_store.damage(target_enemy, damage, self.tick)
+                name = self.enemy_store.wire_key(target_enemy)
+                print(f"[SERVER] {client_id} attacked enemy {name} for {damage} damage; remaining hp: {hp}")
+                if hp <= 0:
+                    print(f"[SERVER] Enemy {name} defeated.")
+                self.publish_enemies()
+
+    def apply_move(self, client_id, message):
+        # Either a run-length path {"path": [[dx, dy, count], ...]} or a single
+        # legacy step {"dx": dx, "dy": dy}. The whole path is applied atomically;
+        # blocked steps are skipped, exactly as separate single steps would be.
+        if "path" in message:
+            steps = decode_path(message["path"])
+        else:
+            steps = decode_path([[message.get("dx", 0), message.get("dy", 0), 1]])
+        with self.world.lock:
+            snapshot = self.world.snapshot
+            if client_id not in snapshot.players:
+                return
+            player = snapshot.players[client_id]
+            x, y = player["x"], player["y"]
+            for dx, dy in steps or ():
+                if self.is_open(snapshot, x + dx, y + dy):
+                    x += dx
+                    y += dy
+                if not self.owns_row(y):
+                    # Stepped onto another shard; the rest of the path is dropped
+                    # and the client reconciles after the handoff.
+                    break
+            fields = {}
+            # Acknowledge the client's move sequence number even if the move is
+            # blocked or rejected, so its prediction can be reconciled.
+            if "seq" in message:
+                fields["seq"] = message["seq"]
+            if (x, y) != (player["x"], player["y"]):
+                fields["x"] = x
+                fields["y"] = y
+            if fields:
+                self.world.publish(players=with_entity(snapshot.players, client_id, **fields))
+
+    def apply_command(self, client, client_id, message):
+        """Dispatch one decoded command from a player."""
+        if "ping" in message:
+            # Latency probe from the client's profiler; echo its timestamp.
+            client.send(encode_frame({"pong": message["ping"]}))
+        elif "sync_chunks" in message:
+            self.apply_sync_chunks(client, message)
+        elif message.get("build", False):
+            self.apply_build(client_id, message)
+        elif message.get("attack", False):
+            self.apply_attack(client_id, message)
+        else:
+            self.apply_move(client_id, message)
+
+    def run_command(self, client, client_id, message):
+        """apply_command, logged first if this session is being recorded."""
+        if self.recorder is None:
+            self.apply_command(client, client_id, message)
+            return
+        # Log and apply under one lock so the log has the order the world saw.
+        with self.world.lock:
+            self.recorder.command(self.tick, client_id, message)
+            self.apply_command(client, client_id, message)
+
+    def join_player(self, client_id, player):
+        with self.world.lock:
+            self.world.publish(players=with_entity(self.world.snapshot.players, client_id, **player))
+            if self.recorder is not None:
+                self.recorder.connect(self.tick, client_id, player)
+
+    def remove_player(self, client_id):
+        """Remove a player from the world; returns their last state, or None."""
+        with self.world.lock:
+            player = self.world.snapshot.players.get(client_id)
+            if player is None:
+                return None
+            self.world.publish(players=without_entity(self.world.snapshot.players, client_id))
+            if self.recorder is not None:
+                self.recorder.disconnect(self.tick, client_id)
+        return player
+
+    def stop_recording(self):
+        """Close the command log with a final checkpoint."""
+        with self.world.lock:
+            if self.recorder is not None:
+                self.recorder.close(self.tick, state_hash(self))
+                print(f"[SERVER] Recorded {self.recorder.records} records to {self.recorder.path}")
+                self.recorder = None
+
+    def count(self, metric, kind):
+        with self.metrics_lock:
+            self.metrics[metric][kind] += 1
+
+    def submit(self, link, message):
+        """Queue a command from `link` if its rate limits and queue allow it."""
+        kind = command_type(message)
+        if len(link.pending) >= MAX_PENDING_COMMANDS or not link.limiter.allow(kind):
+            self.count("dropped", kind)
+            return
+        link.pending.append([kind, message, False])
+        self.count("accepted", kind)
+
+    def process_pending(self, link):
+        """Apply `link`'s queued commands, up to its budget for the current tick."""
+        if not link.lock.acquire(blocking=False):
+            return  # Another thread is already draining this player's queue.
+        try:
+            if link.budget_tick != self.tick:
+                link.budget_tick = self.tick
+                link.budget_used = 0
+            while link.pending and link.budget_used < COMMANDS_PER_TICK and not link.handed_off:
+                kind, message, _ = link.pending.popleft()
+                link.budget_used += 1
+                try:
+                    self.run_command(link.client, link.client_id, message)
+                except Exception as e:
+                    print(f"[SERVER] Error processing message from {link.client_id}: {e}")
+                link.handed_off = self.hand_off_if_leaving(link.client, link.client_id)
+            for entry in list(link.pending):
+                if not entry[2]:
+                    entry[2] = True
+                    self.count("deferred", entry[0])
+        finally:
+            link.lock.release()
+
+    def request_broadcast(self):
+        """Broadcast now, unless one went out very recently; then leave it to the tick."""
+        now = time.monotonic()
+        if now - self.last_broadcast >= MIN_BROADCAST_INTERVAL:
+            self.last_broadcast = now
+            self.broadcast_pending = False
+            self.broadcast_state()
+        else:
+            self.broadcast_pending = True
+
+    def report_metrics(self):
+        now = time.monotonic()
+        if now - self.last_metrics_report < METRICS_INTERVAL:
+            return
+        self.last_metrics_report = now
+        with self.metrics_lock:
+            dropped = dict(self.metrics["dropped"])
+            deferred = dict(self.metrics["deferred"])
+        totals = (sum(dropped.values()), sum(deferred.values()))
+        if totals != self.metrics_reported:
+            self.metrics_reported = totals
+            print(f"[SERVER] Session {self.name}: dropped {dropped}, deferred {deferred}")
+
+    def is_open(self, snapshot, x, y):
+        """True if a player may step onto (x, y) in the given snapshot."""
+        if not self.world_map.is_walkable(x, y):
+            return False
+        if self.enemy_store.at(x, y) is not None or (x, y) in self.object_cells:
+            return False
+        for enemy in self.ghost_entities("enemies"):
+            if enemy["x"] == x and enemy["y"] == y:
+                return False
+        return True
+
+    def publish_enemies(self):
+        """Publish enemy_store's changes as a new snapshot. Caller must hold world.lock."""
+        enemies = self.enemy_store.wire_changes(self.world.snapshot.enemies)
+        if enemies is not None:
+            self.world.publish(enemies=enemies)
+
+    def advance_tick(self):
+        """Run this tick's enemy behaviour and move on to the next tick."""
+        with self.world.lock:
+            snapshot = self.world.snapshot
+            occupied = {(p["x"], p["y"]) for p in snapshot.players.values()}
+            def enemy_can_enter(x, y):
+                return (x, y) not in occupied and self.owns_row(y) and self.is_open(snapshot, x, y)
+            update_enemies(self.enemy_store, self.tick, self.sim_rng, enemy_can_enter)
+            self.publish_enemies()
+            self.tick += 1
+            if self.recorder is not None and self.tick % CHECKPOINT_TICKS == 0:
+                self.recorder.checkpoint(self.tick, state_hash(self))
+
+    def simulate_tick(self):
+        version = self.world.snapshot.version
+        self.advance_tick()
+        # Enemies move first; then commands deferred by the budget are drained
+        # with the new tick's budget, ahead of commands that arrive during it.
+        # They are stamped with the new tick, like any command applied before
+        # its enemy update (see network/recording.py).
+        with self.connections_lock:
+            links = list(self.links.values())
+        for link in links:
+            if link.pending:
+                self.process_pending(link)
+        if self.world.snapshot.version != version or self.broadcast_pending:
+            self.last_broadcast = time.monotonic()
+            self.broadcast_pending = False
+            self.broadcast_state()
+        self.report_metrics()
+
+    def tick_loop(self):
+        next_tick = time.monotonic()
+        while self.running:
+            try:
+                self.simulate_tick()
+            except Exception as e:
+                print(f"[SERVER] Simulation error in session {self.name}: {e}")
+            next_tick += TICK_SECONDS
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def start_simulation(self):
+        threading.Thread(target=self.tick_loop, daemon=True).start()
+
+    def stop(self):
+        """End the simulation and close the command log, if any."""
+        self.running = False
+        self.stop_recording()
+
+    def hand_off_if_leaving(self, client, client_id):
+        """
+        If this shard no longer owns the player's row, remove the player and
+        send their state to the front-end in a handoff frame. Returns True if so.
+        """
+        if self.owned_rows is None:
+            return False
+        with self.world.lock:
+            player = self.world.snapshot.players.get(client_id)
+            if player is None or self.owns_row(player["y"]):
+                return False
+            self.remove_player(client_id)
+        print(f"[SERVER] Handing off {client_id} at y={player['y']}")
+        client.send(encode_frame({"handoff": player}))
+        return True
+
+    def handle_spectator(self, conn, addr, buffer="", hello=None):
+        """
+        Serve a read-only connection, typically a spectator relay (see
+        network/relay.py). It has no player: it gets every state broadcast and
+        every built-block overlay, and the only command it may send is ping.
+        """
+        client = ClientConnection(conn, addr)
+        limiter = CommandLimiter()
+        print(f"[SERVER] Spectator {addr} joined session {self.name}")
+        if hello is not None:
+            accept_hello(client, hello)
+        with self.connections_lock:
+            self.connections.append(client)
+            self.spectators.append(client)
+        chunks = self.known_chunks()
+        if chunks:
+            client.send(self.chunk_frame(chunks))
+        client.send_state(*self.client_state(self.world.snapshot))
+        try:
+            while True:
+                if "\n" not in buffer:
+                    if len(buffer) > MAX_LINE_BYTES:
+                        break
+                    data = conn.recv(1024)
+                    if not data:
+                        break
+                    buffer += data.decode()
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    try:
+                        message = json.loads(line)
+                    except Exception:
+                        continue
+                    if isinstance(message, dict) and "ping" in message and limiter.allow("ping"):
+                        client.send(encode_frame({"pong": message["ping"]}))
+        except OSError:
+            pass
+        finally:
+            print(f"[SERVER] Spectator {addr} left session {self.name}")
+            with self.connections_lock:
+                if client in self.connections:
+                    self.connections.remove(client)
+                if client in self.spectators:
+                    self.spectators.remove(client)
+            client.close()
+            conn.close()
+
+    def handle_client(self, conn, addr, client_id=None, player=None, buffer="", hello=None):
+        """
+        Serve one player connection. `hello` is the client's handshake, if it
+        sent one. A shard worker instead passes the player's id and state from
+        the front-end's join frame (plus any bytes read past it).
+        """
+        client_id = client_id or str(addr)
+        client = ClientConnection(conn, addr)
+        print(f"[SERVER] New connection from {client_id} in session {self.name}")
+        if hello is not None:
+            accept_hello(client, hello)
+        if player is None:
+            player = new_player()
+        self.join_player(client_id, player)
+        # Tell the client which player is theirs before any state arrives.
+        client.send(encode_frame({"welcome": client_id}))
+        link = PlayerLink(client, client_id)
+        with self.connections_lock:
+            self.connections.append(client)
+            self.links[client_id] = link
+        self.broadcast_state()
+
+        try:
+            while not link.handed_off:
+                if "\n" not in buffer:
+                    if len(buffer) > MAX_LINE_BYTES:
+                        print(f"[SERVER] Oversized message from {client_id}; disconnecting")
+                        break
+                    data = conn.recv(1024)
+                    if not data:
+                        break
+                    buffer += data.decode()
+                version = self.world.snapshot.version
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    try:
+                        message = json.loads(line)
+                    except Exception:
+                        message = None
+                    if not isinstance(message, dict):
+                        self.count("dropped", "invalid")
+                        continue
+                    self.submit(link, message)
+                self.process_pending(link)
+                # Only broadcast if this batch of commands actually changed the world.
+                if self.world.snapshot.version != version:
+                    self.request_broadcast()
+        except OSError:
+            pass
+        finally:
+            print(f"[SERVER] Connection closed: {client_id}")
+            with self.connections_lock:
+                if client in self.connections:
+                    self.connections.remove(client)
+                if self.links.get(client_id) is link:
+                    del self.links[client_id]
+                self.chunk_subscriptions.pop(client, None)
+            self.remove_player(client_id)
+            self.broadcast_state()
+            # Let a pending handoff frame reach the front-end before closing.
+            client.flush()
+            client.close()
+            conn.close()
@@ -0,0 +1,294 @@
+# network/shard.py
+# Sharded server mode: the world is split by rows across worker processes.
+#   - A front-end process accepts client connections and relays each one to
+#     the worker that owns the player's current chunk range.
+#   - When a player walks off a worker's rows, the worker sends a handoff
+#     frame with the player's state and the front-end re-joins them on the
+#     neighbouring worker.
+#   - Neighbouring workers subscribe to each other's border rows, so enemies
+#     and players just across a boundary still block movement and building.
+# Run locally with: python -m network.shard --shards 3
+import argparse
+import functools
+import json
+import multiprocessing
+import socket
+import threading
+import time
+from network import server
+from network.connection import ClientConnection
+from network.protocol import encode_frame, read_line
+from network.session import CHUNK_HEIGHT, GameSession, accept_hello, new_player
+
+WORKER_HOST = '127.0.0.1'
+# Rows on each side of a boundary replicated to the neighbour: enough to
+# fill half a tall terminal, since a client keeps its player centred.
+BORDER_ROWS = 2 * CHUNK_HEIGHT
+CONNECT_RETRY_SECONDS = 5.0
+
+class ShardLayout:
+    """
+    Maps rows to shards. Shard i owns chunks [i * chunks_per_shard,
+    (i + 1) * chunks_per_shard); the last shard owns everything below that,
+    since the world is infinite along y.
+    """
+    def __init__(self, shard_count, chunks_per_shard, chunk_height=CHUNK_HEIGHT):
+        self.shard_count = shard_count
+        self.chunks_per_shard = chunks_per_shard
+        self.chunk_height = chunk_height
+
+    def shard_for_y(self, y):
+        chunk_index = max(0, y) // self.chunk_height
+        return min(chunk_index // self.chunks_per_shard, self.shard_count - 1)
+
+    def rows(self, index):
+        """(first_row, end_row) owned by shard `index`; end_row is None for the last shard."""
+        rows_per_shard = self.chunks_per_shard * self.chunk_height
+        first_row = index * rows_per_shard
+        if index == self.shard_count - 1:
+            return first_row, None
+        return first_row, first_row + rows_per_shard
+
+def connect_with_retry(port):
+    deadline = time.monotonic() + CONNECT_RETRY_SECONDS
+    while True:
+        try:
+            return socket.create_connection((WORKER_HOST, port))
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+# ---------------------------------------------------------------------------
+# Worker side
+
+def worker_main(index, layout, world_width, world_height, seed, ports):
+    # Each worker hosts a single session covering its own rows.
+    session = GameSession(server.DEFAULT_SESSION, world_width, world_height,
+                          seed=seed, owned_rows=layout.rows(index))
+    session.start_simulation()
+    for peer in (index - 1, index + 1):
+        if 0 <= peer < layout.shard_count:
+            threading.Thread(target=peer_listener, args=(session, index, peer, ports[peer]),
+                             daemon=True).start()
+    print(f"[SHARD {index}] Owning rows {session.owned_rows}")
+    server.serve(WORKER_HOST, ports[index],
+                 functools.partial(worker_accept, session=session, index=index))
+
+def worker_accept(conn, addr, session, index):
+    # The first line says who is connecting: a neighbouring shard or a player.
+    try:
+        line, buffer = read_line(conn)
+    except OSError:
+        line = None
+    if line is None:
+        conn.close()
+        return
+    hello = json.loads(line)
+    if "peer" in hello:
+        serve_peer(conn, addr, session, index, hello["peer"])
+    else:
+        join = hello["join"]
+        session.handle_client(conn, addr, client_id=join["id"], player=join.get("player"),
+                              buffer=buffer)
+
+def serve_peer(conn, addr, session, index, peer):
+    """Stream the rows of our border facing `peer` until it disconnects."""
+    first_row, end_row = session.owned_rows
+    if peer < index:
+        rows = (first_row, first_row + BORDER_ROWS)
+    else:
+        rows = (end_row - BORDER_ROWS, end_row)
+    link = ClientConnection(conn, addr)
+    with session.connections_lock:
+        session.peer_links.append((link, rows))
+    built = [c for c in range(rows[0] // CHUNK_HEIGHT, (rows[1] - 1) // CHUNK_HEIGHT + 1)
+             if c in session.world_map.overlay_versions]
+    if built:
+        link.send(session.chunk_frame(built))
+    session.broadcast_state()
+    try:
+        while conn.recv(1024):
+            pass
+    except OSError:
+        pass
+    finally:
+        with session.connections_lock:
+            if (link, rows) in session.peer_links:
+                session.peer_links.remove((link, rows))
+        link.close()
+        conn.close()
+
+def peer_listener(session, index, peer, port):
+    """Keep our copies of the neighbour's border entities and built blocks up to date."""
+    while True:
+        try:
+            sock = connect_with_retry(port)
+            sock.sendall(encode_frame({"peer": index}))
+            buffer = b""
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    message = json.loads(line)
+                    if "border" in message:
+                        session.update_ghosts(peer, message["border"])
+                    elif "chunks" in message:
+                        session.update_ghost_chunks(peer, message["chunks"])
+            sock.close()
+        except Exception as e:
+            print(f"[SHARD {index}] Border link to shard {peer} failed: {e}")
+        session.update_ghosts(peer, None)
+        time.sleep(0.5)
+
+# ---------------------------------------------------------------------------
+# Front-end side
+
+class RoutedClient:
+    """Relays one client connection to whichever worker currently owns the player."""
+    def __init__(self, conn, addr, layout, ports):
+        self.conn = conn
+        self.client_id = str(addr)
+        self.layout = layout
+        self.ports = ports
+        self.downstream = ClientConnection(conn, addr)
+        self.upstream = None
+        self.upstream_lock = threading.Lock()
+
+    def join(self, player):
+        shard = self.layout.shard_for_y(player["y"])
+        sock = connect_with_retry(self.ports[shard])
+        sock.sendall(encode_frame({"join": {"id": self.client_id, "player": player}}))
+        print(f"[FRONTEND] {self.client_id} -> shard {shard}")
+        return sock
+
+    def reject(self, reason):
+        self.downstream.send(encode_frame({"error": reason}))
+        self.downstream.flush()
+        self.downstream.close()
+        self.conn.close()
+
+    def run(self):
+        # A sharded server hosts one session, so the client's hello only
+        # negotiates compression (done here, at the edge); anything read past
+        # it goes to the worker. Spectators are turned away: a worker only
+        # knows its own rows and a border band, not the whole world.
+        try:
+            line, buffer = read_line(self.conn)
+        except OSError:
+            line = None
+        if line is None:
+            self.downstream.close()
+            self.conn.close()
+            return
+        try:
+            hello = json.loads(line).get("hello")
+        except Exception:
+            hello = None
+        if hello is None:
+            buffer = line + "\n" + buffer
+        elif not isinstance(hello, dict):
+            self.reject("invalid hello")
+            return
+        elif hello.get("spectator"):
+            self.reject("spectating is not supported by a sharded server")
+            return
+        else:
+            accept_hello(self.downstream, hello)
+        try:
+            self.upstream = self.join(new_player())
+            if buffer:
+                self.upstream.sendall(buffer.encode())
+        except OSError as e:
+            print(f"[FRONTEND] No worker for {self.client_id}: {e}")
+            self.downstream.close()
+            self.conn.close()
+            return
+        threading.Thread(target=self.pump_down, daemon=True).start()
+        self.pump_up()
+
+    def pump_up(self):
+        # Client -> current worker. Lines in flight during a handoff may be
+        # lost; the client's prediction reconciles against the new worker.
+        try:
+            while True:
+                data = self.conn.recv(1024)
+                if not data:
+                    break
+                with self.upstream_lock:
+                    try:
+                        self.upstream.sendall(data)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        finally:
+            with self.upstream_lock:
+                self.upstream.close()
+
+    def pump_down(self):
+        # Worker -> client, watching for handoff frames.
+        sock = self.upstream
+        buffer = b""
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    if line.startswith(b'{"handoff"'):
+                        player = json.loads(line)["handoff"]
+                        new_sock = self.join(player)
+                        with self.upstream_lock:
+                            old_sock, self.upstream = self.upstream, new_sock
+                        old_sock.close()
+                        sock = new_sock
+                        buffer = b""
+                        break
+                    elif line.startswith(b'{"players"'):
+                        self.downstream.send_state(line + b"\n")
+                    else:
+                        self.downstream.send(line + b"\n")
+        except OSError:
+            pass
+        finally:
+            self.downstream.flush()
+            self.downstream.close()
+            self.conn.close()
+
+def route_client(conn, addr, layout, ports):
+    RoutedClient(conn, addr, layout, ports).run()
+
+def frontend_main(layout, ports, port=server.PORT):
+    server.serve(server.HOST, port, functools.partial(route_client, layout=layout, ports=ports))
+
+def start_sharded_server(world_width, world_height, shard_count=2, chunks_per_shard=5, port=server.PORT):
+    """Start worker processes plus an in-process front-end listening on `port`."""
+    layout = ShardLayout(shard_count, chunks_per_shard)
+    ports = [port + 1 + i for i in range(shard_count)]
+    for index in range(shard_count):
+        multiprocessing.Process(
+            target=worker_main,
+            args=(index, layout, world_width, world_height, server.map_seed, ports),
+            daemon=True,
+        ).start()
+    threading.Thread(target=frontend_main, args=(layout, ports, port), daemon=True).start()
+    time.sleep(0.5)
+    return layout, ports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a sharded game server.")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--chunks-per-shard", type=int, default=5)
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=24)
+    parser.add_argument("--port", type=int, default=server.PORT)
+    args = parser.parse_args()
+    start_sharded_server(args.width, args.height, args.shards, args.chunks_per_shard, args.port)
+    while True:
+        time.sleep(1)